@@ -0,0 +1,89 @@
+#!/usr/bin/python
+#
+# @file import_time.py
+#
+# @author matthew.denis.conway@gmail.com
+#
+# @description Benchmark the time taken to import mcmock in a new interpreter,
+# and check it stays within budget:
+#     import_time.py [--budget MILLISECONDS] [--runs N] [--bundle mcmock.pyz]
+# Also checks the modules which are meant to be imported lazily (only by the
+# stage that needs them) aren't imported up front. Exits with 1 if the budget
+# is exceeded or a lazy module was imported.
+#
+
+import os
+import subprocess
+import sys
+
+
+default_budget_ms = 40.0
+default_runs = 20
+
+# Modules which mcmock must not import until a stage needs them
+lazy_modules = [
+    'generate_mock',
+    'header_fingerprint',
+    'mock_manifest',
+    'pre_parse_cache',
+    'json',
+    'hashlib',
+    'pre_parse_c_header',
+    'mock_templates',
+    'datetime',
+    'tempfile',
+    'concurrent.futures',
+    'multiprocessing',
+    'ctypes',
+    'socket'
+]
+
+measure_import = \
+"""import sys, time
+start = time.perf_counter()
+sys.path.insert( 0, %r )
+import mcmock
+elapsed = time.perf_counter() - start
+print( elapsed )
+print( ' '.join( m for m in %r if m in sys.modules ) )
+"""
+
+
+def measure( path, runs ):
+    timings = []
+    imported = ''
+    for i in range( runs ):
+        output = subprocess.check_output( [ sys.executable, '-c', measure_import%( path, lazy_modules ) ] ).decode( 'utf-8' ).split( '\n' )
+        timings.append( float( output[0] ) * 1000 )
+        imported = output[1]
+    timings.sort()
+    return ( timings[len( timings ) // 2], imported )
+
+
+def run_benchmark( argv ):
+    budget_ms = default_budget_ms
+    runs = default_runs
+    paths = [ ( 'scripts', os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), '..', 'scripts' ) ) ]
+    i = 1
+    while i + 1 < len( argv ):
+        if argv[i] == '--budget':
+            budget_ms = float( argv[i+1] )
+        elif argv[i] == '--runs':
+            runs = int( argv[i+1] )
+        elif argv[i] == '--bundle':
+            paths.append( ( 'bundle', os.path.abspath( argv[i+1] ) ) )
+        i += 2
+    result = 0
+    for name, path in paths:
+        median_ms, imported = measure( path, runs )
+        within_budget = median_ms <= budget_ms
+        print( "%-8s median import time %6.2fms (budget %.2fms) %s"%( name, median_ms, budget_ms, 'OK' if within_budget else 'OVER BUDGET' ) )
+        if imported:
+            print( "%-8s imported lazy modules up front: %s"%( name, imported ) )
+        if imported or not within_budget:
+            result = 1
+    return result
+
+
+if __name__ == '__main__':
+    sys.exit( run_benchmark( sys.argv ) )
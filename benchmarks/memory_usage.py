@@ -0,0 +1,98 @@
+#!/usr/bin/python
+#
+# @file memory_usage.py
+#
+# @author matthew.denis.conway@gmail.com
+#
+# @description Benchmark the memory held by parsed headers; a set of synthetic
+# headers is mocked and every GenerateMock is kept alive (as a long running
+# process, i.e. --serve or --watch, keeps parsed headers), then the memory
+# still allocated and the number of each parsed type are reported:
+#     memory_usage.py [--headers N] [--functions N] [--compare SCRIPTS_DIRECTORY]
+# --compare also measures another copy of mcmock's scripts directory (i.e. a
+# git worktree of an earlier commit) so the two can be compared.
+#
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from synthetic_header import write_synthetic_header
+
+
+default_headers = 10
+default_functions = 300
+
+# The parsed types which are counted
+counted_types = [ 'Function', 'MockFunction', 'Parameter', 'Typedef', 'CallbackTypedef', 'DefinedSymbol', 'Token', 'SourceLine' ]
+
+measure_memory = \
+"""import gc, io, json, os, sys, tracemalloc
+sys.path.insert( 0, %r )
+from generate_mock import GenerateMock
+import mcmock_types
+root, output, headers = %r, %r, %r
+tracemalloc.start()
+kept = []
+stdout = sys.stdout
+sys.stdout = io.StringIO()
+for header in headers:
+    kept.append( GenerateMock( root, output, header ) )
+sys.stdout = stdout
+gc.collect()
+current, peak = tracemalloc.get_traced_memory()
+counts = dict( ( name, 0 ) for name in %r )
+for o in gc.get_objects():
+    name = type( o ).__name__
+    if name in counts and type( o ) is getattr( mcmock_types, name, None ):
+        counts[name] += 1
+print( json.dumps( { 'current': current, 'peak': peak, 'counts': counts } ) )
+"""
+
+
+def measure( scripts_directory, root, output, headers ):
+    code = measure_memory%( scripts_directory, root, output, headers, counted_types )
+    return json.loads( subprocess.check_output( [ sys.executable, '-c', code ] ).decode( 'utf-8' ) )
+
+
+def run_benchmark( argv ):
+    headers = default_headers
+    functions = default_functions
+    paths = [ ( 'scripts', os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), '..', 'scripts' ) ) ]
+    i = 1
+    while i + 1 < len( argv ):
+        if argv[i] == '--headers':
+            headers = int( argv[i+1] )
+        elif argv[i] == '--functions':
+            functions = int( argv[i+1] )
+        elif argv[i] == '--compare':
+            paths.append( ( 'compare', os.path.abspath( argv[i+1] ) ) )
+        i += 2
+    root = tempfile.mkdtemp()
+    try:
+        output = os.path.join( root, 'mocks' )
+        os.mkdir( output )
+        header_names = []
+        for h in range( headers ):
+            header_names.append( write_synthetic_header( root, { 'name': 'synthetic_%d'%( h ), 'functions': functions } ) )
+        print( "%d headers of %d functions each"%( headers, functions ) )
+        results = []
+        for name, path in paths:
+            result = measure( os.path.abspath( path ), root, output, header_names )
+            results.append( result )
+            print( "%-8s retained %8.2fMB  peak %8.2fMB"%( name, result['current'] / 1048576.0, result['peak'] / 1048576.0 ) )
+            print( "%-8s %s"%( '', '  '.join( '%s=%d'%( t, result['counts'][t] ) for t in counted_types if result['counts'][t] ) ) )
+        if len( results ) > 1:
+            print( "retained memory is %.1f%% of compare, peak is %.1f%%"%(
+                100.0 * results[0]['current'] / results[1]['current'],
+                100.0 * results[0]['peak'] / results[1]['peak'] ) )
+    finally:
+        shutil.rmtree( root )
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit( run_benchmark( sys.argv ) )
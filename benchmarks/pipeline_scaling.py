@@ -0,0 +1,214 @@
+#!/usr/bin/python
+#
+# @file pipeline_scaling.py
+#
+# @author matthew.denis.conway@gmail.com
+#
+# @description Benchmark how each stage of mock generation scales with the size
+# of the header being mocked:
+#     pipeline_scaling.py [--scale KNOB] [--sizes 200,400,800,1600] [--runs N]
+#         [--max-exponent E] [--functions N] [--parameters N] [--macros N]
+#         [--if-depth N] [--includes N] [--callbacks N]
+# A synthetic header (see synthetic_header.py) is generated for each size of
+# the knob being scaled (functions by default, the other knobs stay fixed) and
+# each stage is timed (best of N runs). The scaling exponent of each stage is
+# the slope of log(time) against log(size): ~1 is linear, ~2 is quadratic.
+# Exits with 1 if --max-exponent is given and a stage exceeds it.
+#
+
+import contextlib
+import io
+import math
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert( 0, os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), '..', 'scripts' ) )
+
+from synthetic_header import write_synthetic_header, default_options
+
+import c_tokenizer
+import conditional_expression
+from strip_c_header import StripCHeader
+from pre_parse_c_header import PreParseCHeader
+from pre_parse_cache import PreParseCache
+from pre_process_c_header import PreProcessCHeader
+from symbol_table import SymbolTable
+from parse_c_header import CHeaderParser
+from build_mock_data import MockDataBuilder
+from generate_mock_source import GenerateMockSource
+from generate_mock_header import GenerateMockHeader
+from mcmock_utils import mcmock_utils_remove_comments, mcmock_utils_remove_whitespace_lines
+
+
+default_sizes = [ 200, 400, 800, 1600 ]
+default_runs = 3
+
+# The stages in the order they run
+stages = [
+    'remove comments',
+    'PreParseCHeader',
+    'included headers',
+    'PreProcessCHeader',
+    'StripCHeader',
+    'CHeaderParser',
+    'MockDataBuilder',
+    'rendering'
+]
+
+
+# Empty the process wide caches, so every run measures the work done for a
+# header seen for the first time
+def clear_caches():
+    c_tokenizer.tokenised_lines.clear()
+    c_tokenizer.previous_tokenised_lines.clear()
+    conditional_expression.compiled_expressions.clear()
+
+
+# Function to run the stages of GenerateMock on a header, returns a dictionary
+# of stage name to the seconds it took
+def time_stages( directory, header ):
+    timings = {}
+    clock = time.perf_counter
+    header_path = os.path.join( directory, header )
+    handle = open( header_path, "r" )
+    header_file_data = handle.readlines()
+    handle.close()
+
+    start = clock()
+    header_file_data = list( mcmock_utils_remove_whitespace_lines( list( mcmock_utils_remove_comments( header_file_data ) ) ) )
+    timings['remove comments'] = clock() - start
+
+    start = clock()
+    pre_parsed_header = PreParseCHeader( header_path, header_file_data )
+    timings['PreParseCHeader'] = clock() - start
+
+    start = clock()
+    pre_parse_cache = PreParseCache()
+    pre_parsed_included_headers = []
+    for included_header in pre_parsed_header.get_included_application_header_list():
+        included_path = os.path.join( directory, included_header )
+        if os.path.isfile( included_path ):
+            pre_parsed_included_headers.append( pre_parse_cache.get_pre_parsed_header( included_path ) )
+    timings['included headers'] = clock() - start
+
+    start = clock()
+    symbol_table = SymbolTable( pre_parsed_header, pre_parsed_included_headers )
+    pre_processed_header = PreProcessCHeader( pre_parsed_header, pre_parsed_included_headers, symbol_table )
+    timings['PreProcessCHeader'] = clock() - start
+
+    # The pre-processed header is pre-parsed again (as GenerateMock does)
+    start = clock()
+    pre_parsed_header = PreParseCHeader( header_path, pre_processed_header.get_pre_processed() )
+    timings['PreParseCHeader'] += clock() - start
+
+    start = clock()
+    stripped = StripCHeader( pre_parsed_header, pre_parsed_included_headers, symbol_table )
+    timings['StripCHeader'] = clock() - start
+
+    start = clock()
+    parsed_header = CHeaderParser( stripped.get_stripped_data(), pre_parsed_header, pre_parsed_included_headers )
+    timings['CHeaderParser'] = clock() - start
+
+    start = clock()
+    mock_data_builder = MockDataBuilder( parsed_header, pre_parsed_included_headers )
+    timings['MockDataBuilder'] = clock() - start
+
+    start = clock()
+    mock_name = header.split( '.h', 1 )[0]
+    mock_source = GenerateMockSource( pre_parsed_header, parsed_header, mock_data_builder, mock_name, header )
+    mock_header = GenerateMockHeader( pre_parsed_header, mock_data_builder, mock_name, header )
+    ''.join( mock_source.get_mock_source_file_chunks( 'mock_%s.c'%( mock_name ), header ) )
+    ''.join( mock_header.get_mock_header_file_chunks( 'mock_%s.h'%( mock_name ), header ) )
+    timings['rendering'] = clock() - start
+    return timings
+
+
+# Function to get the best (lowest) time of each stage over a number of runs
+def best_of_runs( directory, header, runs ):
+    best = {}
+    for run in range( runs ):
+        clear_caches()
+        with contextlib.redirect_stdout( io.StringIO() ):
+            timings = time_stages( directory, header )
+        for stage in stages:
+            if stage not in best or timings[stage] < best[stage]:
+                best[stage] = timings[stage]
+    return best
+
+
+# Function to get the least squares slope of log(time) against log(size)
+def scaling_exponent( sizes, times ):
+    points = [ ( math.log( s ), math.log( t ) ) for s, t in zip( sizes, times ) if s > 0 and t > 0 ]
+    if len( points ) < 2:
+        return float( 'nan' )
+    mean_x = sum( x for x, y in points ) / len( points )
+    mean_y = sum( y for x, y in points ) / len( points )
+    variance = sum( ( x - mean_x ) ** 2 for x, y in points )
+    if variance == 0:
+        return float( 'nan' )
+    return sum( ( x - mean_x ) * ( y - mean_y ) for x, y in points ) / variance
+
+
+def run_benchmark( argv ):
+    options = {}
+    scale = 'functions'
+    sizes = default_sizes
+    runs = default_runs
+    max_exponent = None
+    i = 1
+    while i + 1 < len( argv ):
+        key = argv[i].lstrip( '-' ).replace( '-', '_' )
+        if key == 'scale':
+            scale = argv[i+1].replace( '-', '_' )
+        elif key == 'sizes':
+            sizes = [ int( size ) for size in argv[i+1].split( ',' ) ]
+        elif key == 'runs':
+            runs = int( argv[i+1] )
+        elif key == 'max_exponent':
+            max_exponent = float( argv[i+1] )
+        elif key in default_options and key != 'name':
+            options[key] = int( argv[i+1] )
+        else:
+            sys.stderr.write( "Unknown option %s\n"%( argv[i] ) )
+            return 1
+        i += 2
+    if scale not in default_options or scale == 'name':
+        sys.stderr.write( "Can't scale %s\n"%( scale ) )
+        return 1
+
+    results = {}
+    directory = tempfile.mkdtemp()
+    try:
+        for size in sizes:
+            options[scale] = size
+            header = write_synthetic_header( directory, options )
+            results[size] = best_of_runs( directory, header, runs )
+    finally:
+        shutil.rmtree( directory )
+
+    fixed = dict( default_options )
+    fixed.update( options )
+    print( "Scaling %s (%s), best of %d runs, times in ms"%( scale, ', '.join( '%s=%s'%( k, fixed[k] ) for k in sorted( fixed ) if k not in ( scale, 'name' ) ), runs ) )
+    print( "%-18s%s  exponent"%( 'stage', ''.join( '%10d'%( size ) for size in sizes ) ) )
+    result = 0
+    for stage in stages + [ 'total' ]:
+        if stage == 'total':
+            times = [ sum( results[size].values() ) for size in sizes ]
+        else:
+            times = [ results[size][stage] for size in sizes ]
+        exponent = scaling_exponent( sizes, times )
+        flag = ''
+        if exponent > 1.5:
+            flag = '  superlinear'
+        if max_exponent is not None and stage != 'total' and exponent > max_exponent:
+            flag += '  OVER LIMIT'
+            result = 1
+        print( "%-18s%s  %8.2f%s"%( stage, ''.join( '%10.2f'%( t * 1000 ) for t in times ), exponent, flag ) )
+    return result
+
+
+if __name__ == '__main__':
+    sys.exit( run_benchmark( sys.argv ) )
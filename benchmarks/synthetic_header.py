@@ -0,0 +1,136 @@
+#!/usr/bin/python
+#
+# @file synthetic_header.py
+#
+# @author matthew.denis.conway@gmail.com
+#
+# @description Generate synthetic C headers for benchmarking mcmock:
+#     synthetic_header.py OUTPUT_DIRECTORY [--functions N] [--parameters N]
+#         [--macros N] [--if-depth N] [--includes N] [--callbacks N] [--name NAME]
+# Writes NAME.h (the header to mock) and the headers it includes into the
+# output directory.
+#
+
+import os
+import sys
+
+
+default_options = {
+    'name': 'synthetic',
+    'functions': 100,       # Number of functions declared by the header
+    'parameters': 3,        # Number of parameters of each function
+    'macros': 20,           # Number of #defines in the header
+    'if_depth': 2,          # Depth of the nested #if blocks around the functions
+    'includes': 2,          # Number of application headers included
+    'callbacks': 1          # Number of callback parameters of each function
+}
+
+parameter_types = [ 'uint32_t', 'const char *', 'uint8_t *', 'int', 'bool', 'size_t', 'const void *' ]
+
+
+def generate_included_header( name, index, options ):
+    lines = []
+    guard = '%s_INCLUDE_%d_H'%( name.upper(), index )
+    lines.append( '#ifndef %s'%( guard ) )
+    lines.append( '#define %s'%( guard ) )
+    lines.append( '#include <stdint.h>' )
+    lines.append( '/* Types and symbols used by %s.h */'%( name ) )
+    lines.append( '#define %s_INCLUDE_%d_ENABLED 1'%( name.upper(), index ) )
+    for i in range( options['macros'] ):
+        lines.append( '#define %s_INCLUDE_%d_VALUE_%d ( %d << 2 )'%( name.upper(), index, i, i ) )
+    lines.append( 'typedef uint32_t %s_type_%d_t;'%( name, index ) )
+    lines.append( 'typedef void (*%s_callback_%d_t)( int value, void *user_data );'%( name, index ) )
+    lines.append( 'typedef struct' )
+    lines.append( '{' )
+    lines.append( '    int x;' )
+    lines.append( '    int y;' )
+    lines.append( '} %s_struct_%d_t;'%( name, index ) )
+    lines.append( '#endif' )
+    return lines
+
+
+def generate_function( name, index, options ):
+    parameters = []
+    for i in range( options['parameters'] ):
+        parameters.append( '%s param_%d'%( parameter_types[( index + i ) % len( parameter_types )], i ) )
+    for i in range( options['callbacks'] ):
+        if options['includes']:
+            parameters.append( '%s_callback_%d_t callback_%d'%( name, i % options['includes'], i ) )
+        else:
+            parameters.append( '%s_local_callback_t callback_%d'%( name, i ) )
+    if not parameters:
+        parameters.append( 'void' )
+    return 'uint32_t %s_function_%d( %s );'%( name, index, ', '.join( parameters ) )
+
+
+def generate_header( options ):
+    name = options['name']
+    lines = []
+    lines.append( '/**' )
+    lines.append( ' * Synthetic header, generated to benchmark mcmock' )
+    lines.append( ' */' )
+    lines.append( '#ifndef %s_H'%( name.upper() ) )
+    lines.append( '#define %s_H'%( name.upper() ) )
+    for i in range( options['includes'] ):
+        lines.append( '#include "%s_include_%d.h"'%( name, i ) )
+    lines.append( '#include <stdint.h>' )
+    lines.append( '#include <stdbool.h>' )
+    lines.append( '#include <stddef.h>' )
+    for i in range( options['macros'] ):
+        lines.append( '#define %s_VALUE_%d ( %d + 1 ) // value %d'%( name.upper(), i, i, i ) )
+    lines.append( 'typedef void (*%s_local_callback_t)( int value );'%( name ) )
+    # The functions are spread evenly through the nested #if blocks, every
+    # condition is true so every function is mocked
+    depth = options['if_depth']
+    groups = depth + 1
+    per_group = ( options['functions'] + groups - 1 ) // groups if options['functions'] else 0
+    function_index = 0
+    for level in range( groups ):
+        if level > 0:
+            if level % 2:
+                lines.append( '#if defined( %s_H ) && ( %s_VALUE_0 + %d ) > 0'%( name.upper(), name.upper(), level ) if options['macros'] else '#if %d'%( level ) )
+            else:
+                lines.append( '#ifndef %s_DISABLED_%d'%( name.upper(), level ) )
+        for i in range( per_group ):
+            if function_index < options['functions']:
+                lines.append( generate_function( name, function_index, options ) )
+                function_index += 1
+    for level in range( depth ):
+        lines.append( '#endif' )
+    lines.append( '#endif' )
+    return lines
+
+
+# Function to write the synthetic header (and the headers it includes) to the
+# output directory, returns the name of the header to mock
+def write_synthetic_header( output_directory, options ):
+    values = dict( default_options )
+    values.update( options )
+    for i in range( values['includes'] ):
+        handle = open( os.path.join( output_directory, '%s_include_%d.h'%( values['name'], i ) ), "w" )
+        handle.write( '\n'.join( generate_included_header( values['name'], i, values ) ) + '\n' )
+        handle.close()
+    header = '%s.h'%( values['name'] )
+    handle = open( os.path.join( output_directory, header ), "w" )
+    handle.write( '\n'.join( generate_header( values ) ) + '\n' )
+    handle.close()
+    return header
+
+
+def parse_options( argv ):
+    options = {}
+    i = 0
+    while i + 1 < len( argv ):
+        key = argv[i].lstrip( '-' ).replace( '-', '_' )
+        if key not in default_options:
+            raise ValueError( "Unknown option %s"%( argv[i] ) )
+        options[key] = argv[i+1] if key == 'name' else int( argv[i+1] )
+        i += 2
+    return options
+
+
+if __name__ == '__main__':
+    if len( sys.argv ) < 2:
+        sys.stderr.write( "usage: synthetic_header.py OUTPUT_DIRECTORY [--functions N] [--parameters N] [--macros N] [--if-depth N] [--includes N] [--callbacks N] [--name NAME]\n" )
+        sys.exit( 1 )
+    print( write_synthetic_header( sys.argv[1], parse_options( sys.argv[2:] ) ) )
@@ -0,0 +1,61 @@
+#!/usr/bin/python
+#
+# @file make_bundle.py
+#
+# @author matthew.denis.conway@gmail.com
+#
+# @description Build mcmock into a single executable file (a zipapp), with the
+# bytecode of every module precompiled so nothing is compiled when it starts:
+#     make_bundle.py [mcmock.pyz]
+#     ./mcmock.pyz -o /tmp/mocks/ -r /usr/include -m header.h
+# The bytecode only suits the Python version used to build the bundle; any
+# other version falls back to the module sources, which are bundled too.
+#
+
+import glob
+import os
+import py_compile
+import shutil
+import sys
+import tempfile
+import zipapp
+
+
+bundle_main = \
+"""import sys
+import mcmock
+
+# Guarded so worker processes started by --jobs can import this module safely
+if __name__ == '__main__':
+    mcmock.run_from_cmd_line( sys.argv )
+"""
+
+
+def make_bundle( bundle_path ):
+    scripts_directory = os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), 'scripts' )
+    staging_directory = tempfile.mkdtemp()
+    try:
+        for source_path in glob.glob( os.path.join( scripts_directory, '*.py' ) ):
+            staged_path = os.path.join( staging_directory, os.path.basename( source_path ) )
+            shutil.copy( source_path, staged_path )
+            # Unchecked hash based bytecode is used as-is by the zip importer,
+            # without comparing it against the source it was compiled from
+            py_compile.compile(
+                staged_path,
+                cfile=staged_path + 'c',
+                doraise=True,
+                invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH )
+        main_handle = open( os.path.join( staging_directory, '__main__.py' ), "w" )
+        main_handle.write( bundle_main )
+        main_handle.close()
+        zipapp.create_archive( staging_directory, bundle_path, interpreter='/usr/bin/env python3' )
+    finally:
+        shutil.rmtree( staging_directory )
+    print( "mCmock: Built bundle: %s"%( os.path.realpath( bundle_path ) ) )
+
+
+if __name__ == '__main__':
+    if len( sys.argv ) > 1:
+        make_bundle( sys.argv[1] )
+    else:
+        make_bundle( 'mcmock.pyz' )
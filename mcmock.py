@@ -14,4 +14,6 @@ sys.path.insert( 0, os.path.abspath( os.path.join( os.path.dirname( __file__ ),
 
 import mcmock
 
-mcmock.run_from_cmd_line( sys.argv )
+# Guarded so worker processes started by --jobs can import this module safely
+if __name__ == '__main__':
+    mcmock.run_from_cmd_line( sys.argv )
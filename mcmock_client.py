@@ -0,0 +1,61 @@
+#!/usr/bin/python
+#
+# @file mcmock_client.py
+#
+# @author matthew.denis.conway@gmail.com
+#
+# @description Send a request to a mcmock server (started with mcmock.py
+# --serve). Takes the path of the server's socket followed by the same options
+# as mcmock.py, i.e.
+#     mcmock_client.py /tmp/mcmock.sock -o /tmp/mocks/ -r /usr/include -m header.h
+# Only the standard library is imported, so the client starts quickly.
+#
+
+import json
+import os
+import socket
+import sys
+
+
+def run_client( argv ):
+    if len( argv ) < 2:
+        sys.stderr.write( "mCmock: ERROR: usage: mcmock_client.py <socket> [mcmock options]\n" )
+        return 1
+    request = { 'argv': [ 'mcmock.py' ] + argv[2:], 'cwd': os.getcwd() }
+    if '--stdin' in argv[2:]:
+        request['stdin'] = sys.stdin.read()
+    client_socket = socket.socket( socket.AF_UNIX, socket.SOCK_STREAM )
+    try:
+        client_socket.connect( argv[1] )
+        client_socket.sendall( ( json.dumps( request ) + '\n' ).encode( 'utf-8' ) )
+        response_data = b''
+        while not response_data.endswith( b'\n' ):
+            data = client_socket.recv( 65536 )
+            if not data:
+                break
+            response_data += data
+    except socket.error as e:
+        sys.stderr.write( "mCmock: ERROR: Could not send the request to the server on %s: %s\n"%( argv[1], e ) )
+        return 1
+    finally:
+        client_socket.close()
+    # The server closes the connection without answering (or part way through
+    # the answer) if it is stopped while handling the request
+    if not response_data.endswith( b'\n' ):
+        sys.stderr.write( "mCmock: ERROR: The server on %s closed the connection without answering the request\n"%( argv[1] ) )
+        return 1
+    try:
+        response = json.loads( response_data.decode( 'utf-8' ) )
+    except ValueError:
+        sys.stderr.write( "mCmock: ERROR: Invalid response from the server on %s\n"%( argv[1] ) )
+        return 1
+    for stream_name, text in response['output']:
+        if stream_name == 'stdout':
+            sys.stdout.write( text )
+        else:
+            sys.stderr.write( text )
+    return response['status']
+
+
+if __name__ == '__main__':
+    sys.exit( run_client( sys.argv ) )
@@ -24,12 +24,26 @@ class MockDataBuilder:
     def get_mock_typedefs( self ):
         return self.mock_typedefs
 
+    # Public API to get the typedef generated for a callback parameter of a
+    # function (None if the parameter isn't a callback)
+    def get_callback_typedef( self, function_name, parameter_name ):
+        return self.callback_typedefs.get( ( function_name, parameter_name ) )
+
+    # Public API to get the typedef generated for catching an input pointer
+    # parameter of a function (None if the parameter isn't an input pointer)
+    def get_catch_parameter_typedef( self, function_name, parameter_name ):
+        return self.catch_parameter_typedefs.get( ( function_name, parameter_name ) )
+
     #
     # PRIVATE IMPLEMENTATION
     #
     def __init__( self, parsed_header, pre_parsed_included_headers ):
         self.unittest_apis = []
         self.mock_typedefs = []
+        # The typedefs are also indexed by ( function name, parameter name ),
+        # so the generators can find the typedef for a parameter directly
+        self.callback_typedefs = {}
+        self.catch_parameter_typedefs = {}
         for function in parsed_header.get_function_list():
             self.unittest_apis += self.__add_expectation_api_for_function_to_mock( function )
             self.unittest_apis += self.__add_ignore_param_apis_for_function_to_mock( function )
@@ -43,14 +57,15 @@ class MockDataBuilder:
         for parameter in function.parameters():
             if parameter.type() == ParameterType.PARAMETER_CALLBACK:
                 typedef_name = template_callback_typedef_name.replace( '<function_name>', function.name() ).replace( '<callback_name>', parameter.name() )
-                self.mock_typedefs.append(
+                callback_typedef = \
                     CallbackTypedef (
                         typedef_name,
                         parameter.data_type(),
                         parameter.name(),
                         function.name()
                     )
-                )
+                self.mock_typedefs.append( callback_typedef )
+                self.callback_typedefs[( function.name(), parameter.name() )] = callback_typedef
                 # Create a new parameter that allows unit tests to hook into
                 # this callback and add it to the list.
                 parameter_list.append(
@@ -129,14 +144,15 @@ class MockDataBuilder:
             if param.type() == ParameterType.PARAMETER_IN_POINTER:
                 catch_parameter_api_name = template_catch_parameter_api_name.replace( '<function_name>', function.name() ).replace( '<param_name>', param.name() )
                 catch_parameter_typedef_name = template_catch_parameter_typedef_name.replace( '<api_name>', catch_parameter_api_name )
-                self.mock_typedefs.append(
+                catch_parameter_typedef = \
                     CallbackTypedef (
                         catch_parameter_typedef_name,
                         param.data_type(),
                         param.name(),
                         function.name()
                     )
-                )
+                self.mock_typedefs.append( catch_parameter_typedef )
+                self.catch_parameter_typedefs[( function.name(), param.name() )] = catch_parameter_typedef
                 catch_parameter_apis.append(
                     MockFunction(
                         catch_parameter_api_name,
@@ -0,0 +1,94 @@
+#!/usr/bin/python
+# @file c_splitter.py
+# @author matthew.denis.conway@gmail.com
+# @description Find the boundaries of C statements and argument lists (the
+# separators and brackets which aren't inside any brackets or literals) by
+# their index in the text, so callers slice the text rather than building
+# strings up one character at a time.
+
+
+import re
+
+
+# Each combination of brackets and separators gets a regular expression which
+# only stops on those characters, skipping everything else (string and
+# character literals are matched whole, as the tokenizer matches them, so
+# brackets and separators inside them are ignored)
+structure_regexes = {}
+
+
+def get_structure_regex( brackets, separators ):
+    key = ( brackets, separators )
+    structure_regex = structure_regexes.get( key )
+    if structure_regex is None:
+        structure_regex = re.compile( r"""
+            "(?:[^"\\]|\\.)*"?
+          | '(?:[^'\\]|\\.)*'?
+          | [%s]
+        """%( re.escape( brackets + separators ) ), re.VERBOSE | re.DOTALL )
+        structure_regexes[key] = structure_regex
+    return structure_regex
+
+
+# Function to find the separators which aren't inside brackets.
+# brackets = the opening and closing bracket, i.e. '()' or '{}'
+# depth = how many brackets were already open at the start of the text (so a
+# statement can be scanned a line at a time)
+# Returns a tuple of ( list of the indexes of the separators, the number of
+# brackets open at the end of the text ); a separator after more brackets have
+# been closed than opened still counts as not inside brackets.
+def find_separators( text, separators, brackets='()', depth=0 ):
+    indexes = []
+    opening = brackets[0]
+    closing = brackets[1]
+    # Most lines have no brackets or literals, so the separators are found
+    # without running the regular expression
+    if opening not in text and closing not in text and '"' not in text and "'" not in text:
+        if depth <= 0:
+            for separator in separators:
+                index = text.find( separator )
+                while index >= 0:
+                    indexes.append( index )
+                    index = text.find( separator, index + 1 )
+            if len( separators ) > 1:
+                indexes.sort()
+        return ( indexes, depth )
+    for matched in get_structure_regex( brackets, separators ).finditer( text ):
+        c = matched.group()
+        if c == opening:
+            depth += 1
+        elif c == closing:
+            depth -= 1
+        elif depth <= 0 and len( c ) == 1 and c in separators:
+            indexes.append( matched.start() )
+    return ( indexes, depth )
+
+
+# Function to find the bracket which closes the bracket at open_index, returns
+# its index (or -1 if the bracket is never closed)
+def find_closing_bracket( text, open_index, brackets='()' ):
+    depth = 0
+    opening = brackets[0]
+    closing = brackets[1]
+    for matched in get_structure_regex( brackets, '' ).finditer( text, open_index ):
+        c = matched.group()
+        if c == opening:
+            depth += 1
+        elif c == closing:
+            depth -= 1
+            if depth == 0:
+                return matched.start()
+    return -1
+
+
+# Function to split text at each separator which isn't inside brackets, i.e.
+# an argument list at its commas; returns the list of slices of the text
+# (which aren't stripped)
+def split_outside_brackets( text, separator=',', brackets='()' ):
+    pieces = []
+    start = 0
+    for index in find_separators( text, separator, brackets )[0]:
+        pieces.append( text[start:index] )
+        start = index + 1
+    pieces.append( text[start:] )
+    return pieces
@@ -0,0 +1,96 @@
+#!/usr/bin/python
+# @file c_tokenizer.py
+# @author matthew.denis.conway@gmail.com
+# @description Split C header data into tokens (pre-processor directives,
+# identifiers, numbers, string/character literals and punctuation); every
+# stage of parsing a header works from these tokens. The stages rewrite the
+# header's lines as they go, so rather than a single token stream, each stage
+# tokenises the lines it sees through a cache of tokenised lines, so a line
+# which passes through several stages unchanged is only tokenised once.
+
+
+import re
+from sys import intern
+from mcmock_types import TokenType, Token, SourceLine
+
+
+# A single regular expression recognises every kind of token, so a line is
+# tokenised in one left to right pass. Longer punctuators must be listed before
+# their prefixes (i.e. '...' before '.').
+token_regex = re.compile( r"""
+    (?P<whitespace>\s+)
+  | (?P<identifier>[A-Za-z_][A-Za-z0-9_]*)
+  | (?P<number>\.?[0-9](?:[eEpP][+-]|[A-Za-z0-9_.])*)
+  | (?P<string>"(?:[^"\\]|\\.)*"?)
+  | (?P<character>'(?:[^'\\]|\\.)*'?)
+  | (?P<punctuator>\.\.\.|<<=|>>=|->|\+\+|--|<<|>>|<=|>=|==|!=|&&|\|\||\#\#|[-+*/%&|^]=|[\[\]{}();,.<>=!~?:\#&|^+\-*/%\\])
+  | (?P<unknown>.)
+""", re.VERBOSE | re.DOTALL )
+
+
+token_types = {
+    'identifier': TokenType.TOKEN_IDENTIFIER,
+    'number': TokenType.TOKEN_NUMBER,
+    'string': TokenType.TOKEN_STRING,
+    'character': TokenType.TOKEN_CHARACTER,
+    'punctuator': TokenType.TOKEN_PUNCTUATOR,
+    'unknown': TokenType.TOKEN_UNKNOWN
+}
+
+
+# The same line of text passes through every stage of the pipeline (and common
+# lines repeat across headers), so each distinct line is only tokenised once.
+# The cache is simply emptied if it grows too large.
+tokenised_lines = {}
+max_tokenised_lines = 262144
+
+
+# The lines cached before the header currently being mocked was started (see
+# age_tokenised_lines); a line found here is moved back into tokenised_lines
+previous_tokenised_lines = {}
+
+
+# Function to get the tokenised version of a single line
+def tokenize_line( line ):
+    source_line = tokenised_lines.get( line )
+    if source_line is None:
+        source_line = previous_tokenised_lines.get( line )
+        if source_line is None:
+            tokens = []
+            for matched in token_regex.finditer( line ):
+                token_type = matched.lastgroup
+                if token_type != 'whitespace':
+                    text = matched.group()
+                    # Identifiers and punctuators repeat across lines, so the
+                    # cached lines share a single copy of each
+                    if token_type == 'identifier' or token_type == 'punctuator':
+                        text = intern( text )
+                    tokens.append( Token( token_types[token_type], text, matched.start(), matched.end() ) )
+            source_line = SourceLine( line, tokens )
+        if len( tokenised_lines ) >= max_tokenised_lines:
+            tokenised_lines.clear()
+        tokenised_lines[line] = source_line
+    return source_line
+
+
+# Function to get the header named by a tokenised #include line, as a tuple of
+# ( header, True for an application header "x.h" or False for a system header
+# <x.h> ), or None if the line isn't an include of either form
+def get_included_header( source_line ):
+    included_header = source_line.directive_argument()
+    if source_line.directive() == 'include' and len( included_header ) > 2:
+        if included_header[0] == '"' and included_header[-1] == '"':
+            return ( included_header[1:-1], True )
+        elif included_header[0] == '<' and included_header[-1] == '>':
+            return ( included_header[1:-1], False )
+    return None
+
+
+# Function to call before mocking each header; the lines tokenised before the
+# previous header was started are dropped, unless the previous header used them
+# too (i.e. the lines of a header included by every header), so mocking
+# thousands of headers in one process only keeps the lines of the last two.
+def age_tokenised_lines():
+    previous_tokenised_lines.clear()
+    previous_tokenised_lines.update( tokenised_lines )
+    tokenised_lines.clear()
@@ -0,0 +1,211 @@
+#!/usr/bin/python
+# @file compiler_preprocessor.py
+# @author matthew.denis.conway@gmail.com
+# @description Use the C compiler's pre-processor (i.e. cc -E) instead of
+# mcmock's own; the compiler's output is either produced by running the
+# pre-processor on the header to mock (--cpp), or read from a .i file it has
+# already produced (--cpp-output). The linemarkers in the output show which
+# file each line came from, so only the declarations made by the header to mock
+# itself are kept.
+
+
+import hashlib
+import os.path
+import re
+
+from mcmock_utils import *
+
+
+# A linemarker, either as the pre-processor writes them (# 12 "file.h" 1) or as
+# a #line directive (#line 12 "file.h")
+linemarker_regex = re.compile( r'^\s*#\s*(?:line\s+)?[0-9]+\s+"((?:[^"\\]|\\.)*)"' )
+
+
+# Function to check whether two paths name the same file (False if either
+# doesn't exist)
+def is_same_file( path, other_path ):
+    try:
+        return os.path.samefile( path, other_path )
+    except OSError:
+        return False
+
+
+# Function to get the lines of the pre-processed output which came from the
+# header to mock, excluding any directives the pre-processor passed through
+# (i.e. #pragma). A line came from the header to mock if its linemarker names
+# the same file (relative names are resolved against the current directory,
+# where the pre-processor is run); matching by name alone would take in an
+# included header with the same name, i.e. <sys/time.h> for a local time.h.
+# Exits with an error if the output has no linemarkers, or none name the header
+# to mock, as its lines can't be told apart from the rest.
+def get_header_declarations( preprocessed_lines, header_path, header_to_mock ):
+    declarations = []
+    is_header_to_mock = {}
+    in_header_to_mock = False
+    found_linemarker = False
+    found_header_to_mock = False
+    for line in preprocessed_lines:
+        matched = linemarker_regex.match( line )
+        if matched:
+            found_linemarker = True
+            marked_file = matched.group( 1 )
+            if marked_file not in is_header_to_mock:
+                unescaped_file = re.sub( r'\\(.)', r'\1', marked_file )
+                is_header_to_mock[marked_file] = is_same_file( unescaped_file, header_path )
+            in_header_to_mock = is_header_to_mock[marked_file]
+            found_header_to_mock = found_header_to_mock or in_header_to_mock
+        elif in_header_to_mock:
+            line = line.strip()
+            if line and not line.startswith( '#' ):
+                declarations.append( line )
+    if not found_linemarker:
+        exit_on_error( "ERROR: The pre-processed output of", header_to_mock, "has no linemarkers (was it pre-processed with -P?)" )
+    if not found_header_to_mock:
+        exit_on_error( "ERROR: None of the linemarkers in the pre-processed output of", header_to_mock, "name", header_path, "(relative names are resolved against the current directory)" )
+    return declarations
+
+
+# Function to get the files the pre-processor read (named by the linemarkers),
+# in the order they were first read. Names which aren't files (i.e.
+# "<built-in>") are left out.
+def get_preprocessed_files( preprocessed_lines ):
+    files = []
+    found_files = set()
+    for line in preprocessed_lines:
+        if line.lstrip().startswith( '#' ):
+            matched = linemarker_regex.match( line )
+            if matched and matched.group( 1 ) not in found_files:
+                found_files.add( matched.group( 1 ) )
+                marked_file = re.sub( r'\\(.)', r'\1', matched.group( 1 ) )
+                if os.path.isfile( marked_file ):
+                    files.append( marked_file )
+    return files
+
+
+class CompilerPreprocessor:
+
+
+    # API to get the pre-processed output for a header to mock, as a list of
+    # lines. include_directories = the directories to search for included
+    # headers (passed to the pre-processor with -I)
+    def get_preprocessed_lines( self, header_to_mock, header_path, include_directories ):
+        if self.output_directory:
+            preprocessed_path = self.get_preprocessed_path( header_to_mock )
+            if not os.path.isfile( preprocessed_path ):
+                exit_on_error( "ERROR: Could not find the pre-processed output for", header_to_mock, "\n    Tried:", preprocessed_path )
+            preprocessed_handle = open( preprocessed_path, "r" )
+            preprocessed_lines = preprocessed_handle.readlines()
+            preprocessed_handle.close()
+            return preprocessed_lines
+        command = self.__get_command( header_path, include_directories )
+        sprint( "Pre-processing header file: ", " ".join( command ) )
+        # The header was pre-processed to fingerprint it just before its mock
+        # is generated, so that output is used (once) rather than running the
+        # pre-processor again
+        fingerprinted_output = self.fingerprinted_output
+        self.fingerprinted_output = None
+        if fingerprinted_output is not None and fingerprinted_output[0] == command:
+            return fingerprinted_output[1]
+        try:
+            result = self.__run_command( command )
+        except OSError as e:
+            exit_on_error( "ERROR: Could not run the pre-processor [", self.command, "]:", e )
+        if result.returncode != 0:
+            exit_on_error( "ERROR: The pre-processor [", self.command, "] failed for", header_to_mock, "\n" + result.stderr )
+        return result.stdout.splitlines()
+
+
+    # API to get the path of the .i file holding the pre-processed output for a
+    # header to mock (i.e. dir/header.h is read from <output directory>/dir/header.i)
+    def get_preprocessed_path( self, header_to_mock ):
+        return os.path.join( self.output_directory, os.path.splitext( header_to_mock )[0] + '.i' )
+
+
+    # API to get the files the mock of a header is generated from; the .i file
+    # (if the pre-processed output is read from one) and every file the
+    # pre-processor read
+    def get_input_files( self, header_to_mock, preprocessed_lines ):
+        input_files = []
+        if self.output_directory:
+            input_files.append( self.get_preprocessed_path( header_to_mock ) )
+        return input_files + get_preprocessed_files( preprocessed_lines )
+
+
+    # API to get the options which change the mock generated for a header (so
+    # they can be part of its fingerprint). The pre-processed output is included
+    # by content: a .i file is read, with --cpp the header is pre-processed, so
+    # a change to any file the pre-processor reads (however deeply included)
+    # makes the mock out of date. If the pre-processor fails, the output is left
+    # out, so the mock is regenerated (and the failure reported).
+    def get_options( self, header_to_mock, header_path, include_directories ):
+        digest = hashlib.sha1()
+        if self.output_directory:
+            preprocessed_path = self.get_preprocessed_path( header_to_mock )
+            if os.path.isfile( preprocessed_path ):
+                preprocessed_handle = open( preprocessed_path, "rb" )
+                digest.update( preprocessed_handle.read() )
+                preprocessed_handle.close()
+            return { 'cpp_output': digest.hexdigest() }
+        self.fingerprinted_output = None
+        self.fingerprinted_files = ( header_to_mock, [] )
+        command = self.__get_command( header_path, include_directories )
+        try:
+            result = self.__run_command( command )
+        except OSError:
+            return { 'cpp': self.command }
+        if result.returncode != 0:
+            return { 'cpp': self.command }
+        preprocessed_lines = result.stdout.splitlines()
+        self.fingerprinted_output = ( command, preprocessed_lines )
+        self.fingerprinted_files = ( header_to_mock, get_preprocessed_files( preprocessed_lines ) )
+        digest.update( result.stdout.encode( 'utf-8' ) )
+        return { 'cpp': self.command, 'cpp_output': digest.hexdigest() }
+
+
+    # API to get the files to watch for changes to the mock of a header, other
+    # than the header to mock and its included application headers; the .i
+    # file, or every file the pre-processor read when the header was last
+    # fingerprinted
+    def get_dependencies( self, header_to_mock ):
+        if self.output_directory:
+            return [ self.get_preprocessed_path( header_to_mock ) ]
+        if self.fingerprinted_files[0] == header_to_mock:
+            return self.fingerprinted_files[1]
+        return []
+
+
+    # command = the pre-processor command to run (i.e. "cc -E"), or ''
+    # output_directory = directory holding .i files already produced by the
+    # pre-processor (used instead of running a command), or ''
+    def __init__( self, command, output_directory ):
+        self.command = command
+        self.output_directory = output_directory
+        self.fingerprinted_output = None
+        self.fingerprinted_files = ( None, [] )
+
+
+    # The output kept for the last header fingerprinted isn't sent to the
+    # worker processes (--jobs), which pre-process their headers themselves
+    def __getstate__( self ):
+        state = dict( self.__dict__ )
+        state['fingerprinted_output'] = None
+        state['fingerprinted_files'] = ( None, [] )
+        return state
+
+
+    def __get_command( self, header_path, include_directories ):
+        import shlex
+        try:
+            command = shlex.split( self.command )
+        except ValueError as e:
+            exit_on_error( "ERROR: Could not parse the pre-processor command [", self.command, "]:", e )
+        for include_directory in include_directories:
+            if include_directory:
+                command.append( '-I' + include_directory )
+        command.append( header_path )
+        return command
+
+
+    def __run_command( self, command ):
+        import subprocess
+        return subprocess.run( command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True )
@@ -0,0 +1,266 @@
+#!/usr/bin/python
+# @file conditional_expression.py
+# @author matthew.denis.conway@gmail.com
+# @description Compile the expression of a pre-processor conditional (#if or
+# #elif) into a small syntax tree, which can then be evaluated against the
+# symbols defined for a header.
+
+
+from mcmock_types import TokenType
+from mcmock_utils import *
+from c_tokenizer import tokenize_line
+
+
+# Binary operators, from lowest to highest precedence
+binary_operator_precedence = [
+    [ '||' ],
+    [ '&&' ],
+    [ '|' ],
+    [ '^' ],
+    [ '&' ],
+    [ '==', '!=' ],
+    [ '<', '<=', '>', '>=' ],
+    [ '<<', '>>' ],
+    [ '+', '-' ],
+    [ '*', '/', '%' ]
+]
+
+
+unary_operators = [ '!', '~', '-', '+' ]
+
+
+# The same conditional expressions are repeated many times, in many headers, so
+# each expression is only ever compiled once. Every header adds expressions of
+# its own (i.e. its include guard), so the cache is simply emptied if it grows
+# too large.
+compiled_expressions = {}
+max_compiled_expressions = 65536
+
+
+# Function to get the compiled version of a conditional expression, raises a
+# ValueError if the expression can't be parsed
+def compile_conditional_expression( expression ):
+    compiled = compiled_expressions.get( expression )
+    if compiled is None:
+        compiled = ConditionalExpression( expression )
+        if len( compiled_expressions ) >= max_compiled_expressions:
+            compiled_expressions.clear()
+        compiled_expressions[expression] = compiled
+    return compiled
+
+
+def divide( numerator, denominator ):
+    # C integer division truncates towards zero
+    quotient = abs( numerator ) // abs( denominator )
+    if ( numerator < 0 ) != ( denominator < 0 ):
+        quotient = -quotient
+    return quotient
+
+
+binary_operations = {
+    '||': lambda a, b: int( bool( a() ) or bool( b() ) ),
+    '&&': lambda a, b: int( bool( a() ) and bool( b() ) ),
+    '|': lambda a, b: a() | b(),
+    '^': lambda a, b: a() ^ b(),
+    '&': lambda a, b: a() & b(),
+    '==': lambda a, b: int( a() == b() ),
+    '!=': lambda a, b: int( a() != b() ),
+    '<': lambda a, b: int( a() < b() ),
+    '<=': lambda a, b: int( a() <= b() ),
+    '>': lambda a, b: int( a() > b() ),
+    '>=': lambda a, b: int( a() >= b() ),
+    '<<': lambda a, b: a() << b(),
+    '>>': lambda a, b: a() >> b(),
+    '+': lambda a, b: a() + b(),
+    '-': lambda a, b: a() - b(),
+    '*': lambda a, b: a() * b(),
+    '/': lambda a, b: divide( a(), b() ),
+    '%': lambda a, b: ( lambda x, y: x - y * divide( x, y ) )( a(), b() )
+}
+
+
+unary_operations = {
+    '!': lambda a: int( not a ),
+    '~': lambda a: ~a,
+    '-': lambda a: -a,
+    '+': lambda a: a
+}
+
+
+class ConditionalExpression:
+
+
+    # API to evaluate the expression, the context must provide:
+    #   is_defined( name ) - True if the symbol is defined
+    #   get_value( name ) - integer value of the (object-like macro) symbol
+    #   call( name, arguments ) - integer value of a function-like macro call
+    # Raises a ValueError if the expression can't be evaluated (i.e. division
+    # by zero)
+    def evaluate( self, context ):
+        return self.__evaluate( self.syntax_tree, context )
+
+
+    def get_expression( self ):
+        return self.expression
+
+
+    #
+    # PRIVATE IMPLEMENTATION
+    #
+    # The syntax tree is built from tuples:
+    #   ( 'number', value )
+    #   ( 'defined', name )
+    #   ( 'identifier', name )
+    #   ( 'call', name, arguments )
+    #   ( 'unary', operator, operand )
+    #   ( 'binary', operator, left, right )
+    #   ( 'conditional', condition, if_true, if_false )
+    def __init__( self, expression ):
+        self.expression = expression
+        self.tokens = tokenize_line( expression ).tokens()
+        self.position = 0
+        if not self.tokens:
+            raise ValueError( "Empty conditional expression" )
+        self.syntax_tree = self.__parse_conditional()
+        if self.position != len( self.tokens ):
+            raise ValueError( "Unexpected [%s] in conditional expression"%( self.tokens[self.position].text() ) )
+        # The tokens are only needed while parsing
+        self.tokens = None
+
+
+    def __peek( self ):
+        if self.position < len( self.tokens ):
+            return self.tokens[self.position].text()
+        return None
+
+
+    def __next( self ):
+        if self.position >= len( self.tokens ):
+            raise ValueError( "Unexpected end of conditional expression" )
+        token = self.tokens[self.position]
+        self.position += 1
+        return token
+
+
+    def __expect( self, text ):
+        token = self.__next()
+        if token.text() != text:
+            raise ValueError( "Expected [%s] but got [%s] in conditional expression"%( text, token.text() ) )
+
+
+    def __parse_conditional( self ):
+        condition = self.__parse_binary( 0 )
+        if self.__peek() == '?':
+            self.__next()
+            if_true = self.__parse_conditional()
+            self.__expect( ':' )
+            if_false = self.__parse_conditional()
+            condition = ( 'conditional', condition, if_true, if_false )
+        return condition
+
+
+    def __parse_binary( self, level ):
+        if level == len( binary_operator_precedence ):
+            return self.__parse_unary()
+        left = self.__parse_binary( level + 1 )
+        while self.__peek() in binary_operator_precedence[level]:
+            operator = self.__next().text()
+            right = self.__parse_binary( level + 1 )
+            left = ( 'binary', operator, left, right )
+        return left
+
+
+    def __parse_unary( self ):
+        if self.__peek() in unary_operators:
+            operator = self.__next().text()
+            return ( 'unary', operator, self.__parse_unary() )
+        return self.__parse_primary()
+
+
+    def __parse_primary( self ):
+        token = self.__next()
+        if token.text() == '(':
+            node = self.__parse_conditional()
+            self.__expect( ')' )
+            return node
+        if token.type() == TokenType.TOKEN_NUMBER:
+            return ( 'number', self.__parse_number( token.text() ) )
+        if token.type() == TokenType.TOKEN_CHARACTER:
+            return ( 'number', self.__parse_character( token.text() ) )
+        if token.text() == 'defined':
+            if self.__peek() == '(':
+                self.__next()
+                name = self.__next()
+                self.__expect( ')' )
+            else:
+                name = self.__next()
+            if name.type() != TokenType.TOKEN_IDENTIFIER:
+                raise ValueError( "Expected a symbol name after defined" )
+            return ( 'defined', name.text() )
+        if token.type() == TokenType.TOKEN_IDENTIFIER:
+            if self.__peek() == '(':
+                return ( 'call', token.text(), self.__parse_call_arguments() )
+            return ( 'identifier', token.text() )
+        raise ValueError( "Unexpected [%s] in conditional expression"%( token.text() ) )
+
+
+    # Returns the text of the arguments passed to a function-like macro
+    def __parse_call_arguments( self ):
+        open_brace = self.__next()
+        brace_open_count = 1
+        while brace_open_count > 0:
+            token = self.__next()
+            if token.text() == '(':
+                brace_open_count += 1
+            elif token.text() == ')':
+                brace_open_count -= 1
+        return self.expression[open_brace.end():token.start()].strip()
+
+
+    def __parse_number( self, number ):
+        digits = number.rstrip( 'uUlL' )
+        try:
+            if digits[0:2] in [ '0x', '0X' ]:
+                return int( digits[2:], 16 )
+            if digits[0:2] in [ '0b', '0B' ]:
+                return int( digits[2:], 2 )
+            if len( digits ) > 1 and digits.startswith( '0' ):
+                return int( digits[1:], 8 )
+            return int( digits )
+        except ValueError:
+            raise ValueError( "Invalid integer [%s] in conditional expression"%( number ) )
+
+
+    def __parse_character( self, character ):
+        value = character[1:-1]
+        escapes = { 'n': 10, 't': 9, 'r': 13, '0': 0, '\\': 92, '\'': 39, '"': 34 }
+        if len( value ) == 2 and value[0] == '\\' and value[1] in escapes:
+            return escapes[value[1]]
+        if len( value ) == 1:
+            return ord( value )
+        raise ValueError( "Invalid character [%s] in conditional expression"%( character ) )
+
+
+    def __evaluate( self, node, context ):
+        node_type = node[0]
+        if node_type == 'number':
+            return node[1]
+        elif node_type == 'defined':
+            return int( bool( context.is_defined( node[1] ) ) )
+        elif node_type == 'identifier':
+            return context.get_value( node[1] )
+        elif node_type == 'call':
+            return context.call( node[1], node[2] )
+        elif node_type == 'unary':
+            return unary_operations[node[1]]( self.__evaluate( node[2], context ) )
+        elif node_type == 'binary':
+            try:
+                return binary_operations[node[1]](
+                    lambda: self.__evaluate( node[2], context ),
+                    lambda: self.__evaluate( node[3], context ) )
+            except ZeroDivisionError:
+                raise ValueError( "Division by zero in conditional expression" )
+        else:
+            if self.__evaluate( node[1], context ):
+                return self.__evaluate( node[2], context )
+            return self.__evaluate( node[3], context )
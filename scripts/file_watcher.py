@@ -0,0 +1,149 @@
+#!/usr/bin/python
+# @file file_watcher.py
+# @author matthew.denis.conway@gmail.com
+# @description Wait for a set of files to change, using inotify on Linux and
+# falling back to polling the files on any other platform
+
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+
+from mcmock_utils import *
+
+
+# inotify events which mean a watched file may have changed. Directories are
+# watched, rather than the files themselves, so files replaced by an editor
+# (written to a temporary file and renamed) are still seen.
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_CLOEXEC = 0x00080000
+inotify_mask = IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+inotify_event_header = struct.Struct( 'iIII' )
+
+# Seconds to keep collecting changes after the first one, so all the files
+# written by a single save (or a checkout) are reported together
+settle_time = 0.1
+
+# Seconds between checks when polling
+poll_interval = 0.5
+
+
+class FileWatcher:
+
+
+    # API to set the files to watch (replacing any files watched before)
+    def watch( self, paths ):
+        self.paths = set( [ os.path.abspath( p ) for p in paths ] )
+        if self.inotify_fd is not None:
+            self.__update_inotify_watches()
+        else:
+            # Files which were already watched keep their old state, so changes
+            # made since the last check aren't lost
+            snapshot = self.__take_snapshot()
+            for path in self.paths:
+                if path in self.snapshot:
+                    snapshot[path] = self.snapshot[path]
+            self.snapshot = snapshot
+
+
+    # API to wait until at least one of the watched files has changed (been
+    # written, created, deleted or renamed), returns the set of changed paths
+    def wait_for_changes( self ):
+        changed = set()
+        while not changed:
+            if self.inotify_fd is not None:
+                changed = self.__read_inotify_changes( None )
+            else:
+                time.sleep( poll_interval )
+                changed = self.__poll_changes()
+        time.sleep( settle_time )
+        if self.inotify_fd is not None:
+            changed |= self.__read_inotify_changes( 0 )
+        else:
+            changed |= self.__poll_changes()
+        return changed
+
+
+    # API to get the name of the method used to watch the files
+    def get_method( self ):
+        if self.inotify_fd is not None:
+            return 'inotify'
+        return 'polling'
+
+
+    def __init__( self ):
+        self.paths = set()
+        self.snapshot = {}
+        self.watched_directories = {}
+        self.inotify_fd = None
+        self.libc = None
+        try:
+            self.libc = ctypes.CDLL( ctypes.util.find_library( 'c' ), use_errno=True )
+            inotify_fd = self.libc.inotify_init1( IN_CLOEXEC )
+            if inotify_fd >= 0:
+                self.inotify_fd = inotify_fd
+        except ( OSError, AttributeError, TypeError ):
+            # No inotify (i.e. not Linux), so poll the files instead
+            self.inotify_fd = None
+
+
+    def __update_inotify_watches( self ):
+        directories = set( [ os.path.dirname( p ) for p in self.paths ] )
+        for directory in list( self.watched_directories.keys() ):
+            if directory not in directories:
+                self.libc.inotify_rm_watch( self.inotify_fd, self.watched_directories[directory] )
+                del self.watched_directories[directory]
+        for directory in directories:
+            if directory not in self.watched_directories:
+                watch_descriptor = self.libc.inotify_add_watch( self.inotify_fd, directory.encode( 'utf-8' ), inotify_mask )
+                # A directory which doesn't exist can't be watched; files in it
+                # will be picked up once a watched file is changed
+                if watch_descriptor >= 0:
+                    self.watched_directories[directory] = watch_descriptor
+
+
+    # Reads the pending inotify events, waiting up to timeout seconds for the
+    # first event (forever if timeout is None)
+    def __read_inotify_changes( self, timeout ):
+        directories = dict( [ ( wd, directory ) for directory, wd in self.watched_directories.items() ] )
+        changed = set()
+        while select.select( [ self.inotify_fd ], [], [], timeout )[0]:
+            events = os.read( self.inotify_fd, 65536 )
+            offset = 0
+            while offset < len( events ):
+                watch_descriptor, mask, cookie, name_length = inotify_event_header.unpack_from( events, offset )
+                offset += inotify_event_header.size
+                name = events[offset:offset + name_length].rstrip( b'\0' ).decode( 'utf-8', 'replace' )
+                offset += name_length
+                if watch_descriptor in directories:
+                    path = os.path.join( directories[watch_descriptor], name )
+                    if path in self.paths:
+                        changed.add( path )
+            timeout = 0
+        return changed
+
+
+    def __take_snapshot( self ):
+        snapshot = {}
+        for path in self.paths:
+            try:
+                status = os.stat( path )
+                snapshot[path] = ( status.st_mtime, status.st_size )
+            except OSError:
+                snapshot[path] = None
+        return snapshot
+
+
+    def __poll_changes( self ):
+        snapshot = self.__take_snapshot()
+        changed = set( [ path for path in self.paths if snapshot[path] != self.snapshot.get( path ) ] )
+        self.snapshot = snapshot
+        return changed
@@ -5,15 +5,20 @@
 # unittest APIs that control the mock
 
 import os.path
-import re
 
 from strip_c_header import StripCHeader
 from pre_parse_c_header import PreParseCHeader
+from pre_parse_cache import PreParseCache
+from include_resolver import IncludeResolver
 from pre_process_c_header import PreProcessCHeader
+from symbol_table import SymbolTable
 from parse_c_header import CHeaderParser
 from build_mock_data import MockDataBuilder
 from generate_mock_source import GenerateMockSource
 from generate_mock_header import GenerateMockHeader
+from mock_file_writer import MockFileWriter
+from mock_depfile import MockDepfile
+from stage_profiler import StageProfiler
 
 from mcmock_utils import *
 
@@ -21,31 +26,61 @@ from mcmock_utils import *
 class GenerateMock:
 
 
-    def __remove_comments( self, unparsed_data ):
-        # Convert the list of strings (the file data) into a single string
-        full_file = ''
-        for line in unparsed_data:
-            full_file += line
-        return re.sub( r'(\/\*([^*]|[\r\n]|(\*+([^*/]|[\r\n])))*\*\/+)|(//.*)', '', full_file).splitlines()
-
-
-    def __remove_whitespace_lines( self, unparsed_data ):
-        stripped = []
-        for line in unparsed_data:
-            if not ( re.match(r'^\s*$', line) ):
-                stripped.append( line.strip() )
-        return stripped
-
-
-    def __init__( self, root_include_directory, output_directory, header_to_mock, additional_include_directories=[] ):
+    # API to get the paths of the generated mock header and source files (and
+    # the dependency file, if one was written)
+    def get_generated_files( self ):
+        return self.generated_files
+
+
+    # API to get the paths of the files the mock was generated from (the header
+    # to mock first)
+    def get_input_files( self ):
+        return self.input_files
+
+
+    # pre_parse_cache = PreParseCache shared by all the headers mocked in a run
+    # (if not supplied, included headers are pre-parsed for this mock only)
+    # include_resolver = IncludeResolver for the root and additional include
+    # directories, shared by all the headers mocked in a run (if not supplied,
+    # one is created for this mock only)
+    # profiler = StageProfiler to record the time and memory taken by each stage
+    # of generating the mock (if not supplied, nothing is recorded)
+    # preprocessor = CompilerPreprocessor to pre-process the header with the C
+    # compiler (if not supplied, mcmock's own pre-processor is used)
+    # generation_date = the date stamped into the generated files, '' to leave
+    # the date out (if not supplied, today's date is used)
+    # write_depfile = whether to write a Makefile syntax dependency file for the
+    # mock, as mock_<name>.mcmock.d beside the mock files
+    def __init__( self, root_include_directory, output_directory, header_to_mock, additional_include_directories=[], pre_parse_cache=None, include_resolver=None, profiler=None, preprocessor=None, generation_date=None, write_depfile=False ):
+        if profiler is None:
+            profiler = StageProfiler( header_to_mock, False )
+        self.profiler = profiler
+        self.preprocessor = preprocessor
+        if generation_date is None:
+            generation_date = mcmock_utils_get_generation_date()
+        self.generation_date = generation_date
         self.__create_mock_names( header_to_mock )
         self.include_mocked_header = header_to_mock
-        self.__preprocess_and_parse_header_file( root_include_directory, header_to_mock, additional_include_directories )
+        if pre_parse_cache is None:
+            pre_parse_cache = PreParseCache()
+        self.pre_parse_cache = pre_parse_cache
+        if include_resolver is None:
+            include_resolver = IncludeResolver( [ root_include_directory ] + additional_include_directories )
+        self.include_resolver = include_resolver
+        self.input_files = []
+        self.__preprocess_and_parse_header_file( root_include_directory, header_to_mock )
         self.__generate_mock_files()
         if not output_directory.endswith( '/' ):
             output_directory = output_directory + '/'
-        self.__write_mock_header_file( output_directory + os.path.dirname( header_to_mock ) + '/' )
-        self.__write_mock_source_file( output_directory + os.path.dirname( header_to_mock ) + '/' )
+        self.generated_files = []
+        # The mock of a header in a subdirectory goes in the same subdirectory
+        # of the output directory (i.e. when mocking a whole --tree)
+        mock_directory = output_directory + os.path.dirname( header_to_mock ) + '/'
+        os.makedirs( mock_directory, exist_ok=True )
+        self.__write_mock_header_file( mock_directory )
+        self.__write_mock_source_file( mock_directory )
+        if write_depfile:
+            self.__write_depfile( mock_directory )
 
 
     def __create_mock_names( self, header_to_mock ):
@@ -54,10 +89,11 @@ class GenerateMock:
         self.mock_name = header_to_mock.split( '.h', 1 )[0].replace( "/", "_" )
         self.header_file_name = "mock_%s.h"%( self.mock_name )
         self.source_file_name = "mock_%s.c"%( self.mock_name )
+        self.depfile_name = "mock_%s.mcmock.d"%( self.mock_name )
         self.mocked_header_name = header_to_mock
 
 
-    def __preprocess_and_parse_header_file( self, root_include_directory, header_to_mock, additional_include_directories ):
+    def __preprocess_and_parse_header_file( self, root_include_directory, header_to_mock ):
         # This is a very important function, it generates some very useful data
         # structures used to generate the mock, these are:
         #
@@ -67,31 +103,30 @@ class GenerateMock:
 
         # Ensure the path to the root of where the "header to mock" lives is
         # going to be valid before trying to open the file
-        header_path = ""
-        useful_error_msg = ""
-        if os.path.isfile( os.path.join(root_include_directory, header_to_mock) ):
-            header_path = os.path.join(root_include_directory, header_to_mock)
-        else:
-            useful_error_msg = "    Tried: " + os.path.join(root_include_directory, header_to_mock) + "\n"
-            for include_dir in additional_include_directories:
-                if os.path.isfile( os.path.join(include_dir, header_to_mock) ):
-                    header_path = os.path.join(include_dir, header_to_mock)
-                    break;
-                else:
-                    useful_error_msg = "    Tried: " + os.path.join(include_dir, header_to_mock) + "\n"
+        header_path = self.include_resolver.find_header( header_to_mock )
         if not header_path:
+            useful_error_msg = ""
+            for tried_path in self.include_resolver.get_search_paths( header_to_mock ):
+                useful_error_msg += "    Tried: " + tried_path + "\n"
+
             exit_on_error( "ERROR: Could not find header file to mock: " + header_to_mock + "\n" + useful_error_msg )
         sprint( "Opening header file to mock: ", header_path )
+        self.input_files.append( header_path )
+        if self.preprocessor is not None:
+            self.__parse_compiler_preprocessed_header_file( header_path, header_to_mock )
+            return
         source_file_handle = open( header_path, "r" );
         header_file_data = source_file_handle.readlines()
         source_file_handle.close()
 
-        working_copy = []
-        working_copy = list( self.__remove_comments( header_file_data ) )
-        working_copy = list( self.__remove_whitespace_lines( working_copy ) )
-        header_file_data = list( working_copy )
+        with self.profiler.stage( 'comment removal' ):
+            working_copy = []
+            working_copy = list( mcmock_utils_remove_comments( header_file_data ) )
+            working_copy = list( mcmock_utils_remove_whitespace_lines( working_copy ) )
+            header_file_data = list( working_copy )
 
-        self.pre_parsed_header = PreParseCHeader( os.path.join(root_include_directory, header_to_mock), header_file_data )
+        with self.profiler.stage( 'pre-parse' ):
+            self.pre_parsed_header = PreParseCHeader( os.path.join(root_include_directory, header_to_mock), header_file_data )
 
         # The "header to mock" may include other header files - each of these
         # must be individually parsed to extract key information about any
@@ -101,50 +136,88 @@ class GenerateMock:
         # pre-parse them as well.
         self.pre_parsed_included_headers = []
 
-        path_to_included_header = None
-        for included_header in self.pre_parsed_header.get_included_application_header_list():
-            # Start by checking if the included header exists in the same
-            # directory as the "header to mock". If it doesn't, check each
-            # path supplied to MCMOCK in the list of additional include paths
-            if os.path.isfile( os.path.join( root_include_directory, included_header ) ):
-                path_to_included_header = included_header
-            else:
-                for inc_dir in additional_include_directories:
-                    if not inc_dir.endswith('/'):
-                        inc_dir += '/'
-                    if os.path.isfile( inc_dir + included_header ):
-                        path_to_included_header = inc_dir + included_header
-                        break
-            if path_to_included_header:
-                included_header_handle = open( path_to_included_header, "r" );
-                sprint("Pre-parsing included header: ", path_to_included_header)
-                self.pre_parsed_included_headers.append( PreParseCHeader( path_to_included_header, included_header_handle.readlines() ) )
-                included_header_handle.close()
-            else:
-                sprint( "WARNING: Could not find the included header[", included_header, "] for pre-parsing (without this, generating the mock may fail)" )
-        pre_processed_header = PreProcessCHeader( self.pre_parsed_header, self.pre_parsed_included_headers )
-        self.pre_parsed_header = PreParseCHeader( path_to_included_header, pre_processed_header.get_pre_processed() )
-        temp_stripped = StripCHeader( self.pre_parsed_header, self.pre_parsed_included_headers )
-        self.parsed_header = CHeaderParser( temp_stripped.get_stripped_data(), self.pre_parsed_header, self.pre_parsed_included_headers )
-
+        with self.profiler.stage( 'include pre-parse' ):
+            for included_header in self.pre_parsed_header.get_included_application_header_list():
+                # Start by checking if the included header exists in the root
+                # include directory. If it doesn't, check each path supplied to
+                # MCMOCK in the list of additional include paths
+                path_to_included_header = self.include_resolver.find_header( included_header )
+                if path_to_included_header:
+                    misses = self.pre_parse_cache.get_misses()
+                    self.pre_parsed_included_headers.append( self.pre_parse_cache.get_pre_parsed_header( path_to_included_header ) )
+                    if self.pre_parse_cache.get_misses() == misses:
+                        sprint( "Reusing pre-parsed header:   ", path_to_included_header )
+                        self.profiler.count( 'pre_parse_cache_hits' )
+                    else:
+                        sprint( "Pre-parsing included header: ", path_to_included_header )
+                        self.profiler.count( 'pre_parse_cache_misses' )
+                    self.input_files.append( path_to_included_header )
+                else:
+                    sprint( "WARNING: Could not find the included header[", included_header, "] for pre-parsing (without this, generating the mock may fail)" )
+        with self.profiler.stage( 'pre-process' ):
+            # Pre-processing doesn't change any #defines, so the same table of
+            # defined symbols serves both pre-processing and stripping
+            symbol_table = SymbolTable( self.pre_parsed_header, self.pre_parsed_included_headers )
+            pre_processed_header = PreProcessCHeader( self.pre_parsed_header, self.pre_parsed_included_headers, symbol_table )
+        with self.profiler.stage( 'pre-parse' ):
+            self.pre_parsed_header = PreParseCHeader( header_path, pre_processed_header.get_pre_processed() )
+        with self.profiler.stage( 'strip' ):
+            temp_stripped = StripCHeader( self.pre_parsed_header, self.pre_parsed_included_headers, symbol_table )
+        with self.profiler.stage( 'parse' ):
+            self.parsed_header = CHeaderParser( temp_stripped.get_stripped_data(), self.pre_parsed_header, self.pre_parsed_included_headers )
+
+
+
+    # The declarations come from the compiler's pre-processed output, where all
+    # macros have been expanded and conditional blocks resolved, so they go
+    # straight to the parser (as the output of PreProcessCHeader does, the
+    # declarations no longer hold any #includes)
+    def __parse_compiler_preprocessed_header_file( self, header_path, header_to_mock ):
+        from compiler_preprocessor import get_header_declarations
+        self.pre_parsed_included_headers = []
+        with self.profiler.stage( 'pre-process' ):
+            preprocessed_lines = self.preprocessor.get_preprocessed_lines( header_to_mock, header_path, self.include_resolver.get_include_directories() )
+            declarations = get_header_declarations( preprocessed_lines, header_path, header_to_mock )
+            self.input_files.extend( self.preprocessor.get_input_files( header_to_mock, preprocessed_lines ) )
+        with self.profiler.stage( 'pre-parse' ):
+            self.pre_parsed_header = PreParseCHeader( header_path, declarations )
+        with self.profiler.stage( 'parse' ):
+            self.parsed_header = CHeaderParser( self.pre_parsed_header.get_unparsed_content(), self.pre_parsed_header, self.pre_parsed_included_headers )
 
 
     def __generate_mock_files( self ):
-        mock_data_builder = MockDataBuilder( self.parsed_header, self.pre_parsed_included_headers )
-        self.mock_source = GenerateMockSource( self.pre_parsed_header, self.parsed_header, mock_data_builder, self.mock_name, self.include_mocked_header )
-        self.mock_header = GenerateMockHeader( self.pre_parsed_header, mock_data_builder, self.mock_name, self.include_mocked_header )
+        with self.profiler.stage( 'mock-data build' ):
+            mock_data_builder = MockDataBuilder( self.parsed_header, self.pre_parsed_included_headers )
+        with self.profiler.stage( 'render' ):
+            self.mock_source = GenerateMockSource( self.pre_parsed_header, self.parsed_header, mock_data_builder, self.mock_name, self.include_mocked_header, self.generation_date )
+            self.mock_header = GenerateMockHeader( self.pre_parsed_header, mock_data_builder, self.mock_name, self.include_mocked_header, self.generation_date )
 
 
     def __write_mock_header_file( self, output_directory ):
         sprint( "Generated mock header file:  ", os.path.realpath( output_directory + self.header_file_name ) )
-        mock_header_file_handle = open( output_directory + self.header_file_name, "w+" )
-        mock_header_file_handle.write( self.mock_header.get_mock_header_file_contents( self.header_file_name, self.mocked_header_name ) )
-        mock_header_file_handle.close()
+        self.__write_mock_file( output_directory + self.header_file_name, self.mock_header.get_mock_header_file_chunks( self.header_file_name, self.mocked_header_name ) )
 
 
     def __write_mock_source_file( self, output_directory ):
         sprint( "Generated mock source file:  ", os.path.realpath( output_directory + self.source_file_name ) )
-        mock_source_file_handle = open( output_directory + self.source_file_name, "w+" )
-        mock_source_file_handle.write( self.mock_source.get_mock_source_file_contents( self.source_file_name, self.mocked_header_name ) )
-        mock_source_file_handle.close()
+        self.__write_mock_file( output_directory + self.source_file_name, self.mock_source.get_mock_source_file_chunks( self.source_file_name, self.mocked_header_name ) )
+
+
+    def __write_depfile( self, output_directory ):
+        sprint( "Generated dependency file:   ", os.path.realpath( output_directory + self.depfile_name ) )
+        with self.profiler.stage( 'write' ):
+            MockDepfile( output_directory + self.depfile_name, list( self.generated_files ), self.input_files ).write()
+        self.generated_files.append( output_directory + self.depfile_name )
+
+
+    def __write_mock_file( self, path, chunks ):
+        if self.profiler.is_enabled():
+            # The chunks are normally rendered as they are written; when
+            # profiling, the whole file is rendered first so rendering and
+            # writing are recorded separately
+            with self.profiler.stage( 'render' ):
+                chunks = list( chunks )
+        with self.profiler.stage( 'write' ):
+            MockFileWriter( path ).write( chunks )
+        self.generated_files.append( path )
 
@@ -5,8 +5,8 @@
 
 
 from mock_templates import *
+from template_engine import compile_template
 from mcmock_utils import *
-from datetime import datetime
 
 
 class GenerateMockHeader:
@@ -14,66 +14,85 @@ class GenerateMockHeader:
 
     # API to get the generated file content of the mock header
     def get_mock_header_file_contents( self, filename, mocked_header_name ):
-        retval = self.file_source
-        retval = retval.replace( '<filename>', filename )
-        retval = retval.replace( '<mocked_header_name>', mocked_header_name )
-        return retval
-
-
-    def __init__( self, pre_parsed_header, mock_data_builder, component_to_mock_name, mocked_header_name ):
-        generation_date = "%02d/%02d/%04d"%( datetime.now().day, datetime.now().month, datetime.now().year )
-        mock_file_banner = mocked_file_banner_template.replace( "<generation_date>", generation_date )
-        file_data = self.__add_application_included_headers( pre_parsed_header.get_included_application_header_list(), mocked_header_name )
-        file_data += self.__add_system_included_headers( pre_parsed_header.get_included_system_header_list() )
-        file_data += self.__add_mock_type_definitions( mock_data_builder.get_mock_typedefs() )
-        file_data += self.__create_mock_api_definitions( mock_data_builder.get_build_mock_data() )
-        self.file_source = file_data
-        self.file_source = mock_header_include_guard_template.replace( "<header_file_banner>", mock_file_banner )
-        self.file_source = self.file_source.replace( "<source_code>", file_data )
-        self.file_source = self.file_source.replace( "<mock_name>", component_to_mock_name )
-        self.file_source = self.file_source.replace( "<mock_name_upper>", component_to_mock_name.upper() )
-
-
-    def __add_application_included_headers( self, included_application_headers, mocked_header_name ):
-        headers = '#include \"%s\"\n'%( mocked_header_name )
+        return ''.join( self.get_mock_header_file_chunks( filename, mocked_header_name ) )
+
+
+    # API to get the generated file content of the mock header as a generator
+    # of chunks; the header is rendered a piece at a time as the chunks are
+    # consumed, so it never has to be held in memory whole
+    def get_mock_header_file_chunks( self, filename, mocked_header_name ):
+        file_banner = compile_template( self.__get_file_banner_template() ).render_into( [], {
+            'filename': filename,
+            'mocked_header_name': mocked_header_name,
+            'generation_date': self.generation_date } )
+        return compile_template( mock_header_include_guard_template ).render_chunks( {
+            'header_file_banner': file_banner,
+            'source_code': self.__render_source_code(),
+            'mock_name_upper': self.component_to_mock_name.upper() } )
+
+
+    # generation_date = the date stamped into the file banner, '' to leave the
+    # date out (if not supplied, today's date is used)
+    def __init__( self, pre_parsed_header, mock_data_builder, component_to_mock_name, mocked_header_name, generation_date=None ):
+        if generation_date is None:
+            generation_date = mcmock_utils_get_generation_date()
+        self.generation_date = generation_date
+        self.pre_parsed_header = pre_parsed_header
+        self.mock_data_builder = mock_data_builder
+        self.component_to_mock_name = component_to_mock_name
+        self.mocked_header_name = mocked_header_name
+
+
+    def __get_file_banner_template( self ):
+        if self.generation_date:
+            return mocked_file_banner_template
+        return mocked_file_undated_banner_template
+
+
+    # Generator of the chunks of the source code inside the include guard
+    def __render_source_code( self ):
+        source_code = []
+        self.__add_application_included_headers( source_code, self.pre_parsed_header.get_included_application_header_list(), self.mocked_header_name )
+        self.__add_system_included_headers( source_code, self.pre_parsed_header.get_included_system_header_list() )
+        self.__add_mock_type_definitions( source_code, self.mock_data_builder.get_mock_typedefs() )
+        for chunk in source_code:
+            yield chunk
+        for chunk in self.__create_mock_api_definitions( self.mock_data_builder.get_build_mock_data() ):
+            yield chunk
+
+
+    def __add_application_included_headers( self, source_code, included_application_headers, mocked_header_name ):
+        source_code.append( '#include \"%s\"\n'%( mocked_header_name ) )
         if included_application_headers:
             for header in included_application_headers:
-                headers += template_included_application_header.replace( '<include_name>', header )
-        headers += "\n"
-        return headers
+                compile_template( template_included_application_header ).render_into( source_code, { 'include_name': header } )
+        source_code.append( "\n" )
 
 
-    def __add_system_included_headers( self, included_system_headers ):
-        headers = ''
+    def __add_system_included_headers( self, source_code, included_system_headers ):
         if included_system_headers:
             for header in included_system_headers:
-                headers += template_included_system_header.replace( '<include_name>', header ) + "\n"
-        headers += "\n"
-        return headers
+                compile_template( template_included_system_header ).render_into( source_code, { 'include_name': header } )
+                source_code.append( "\n" )
+        source_code.append( "\n" )
 
 
-    def __add_mock_type_definitions( self, mock_typedefs ):
-        typedefs = ''
+    def __add_mock_type_definitions( self, source_code, mock_typedefs ):
         for t in mock_typedefs:
-            typedefs += template_create_callback_typedef.replace( '<typedef_name>', t.typedef_name() ).replace( '<callback_type>', t.callback_type() ).replace( '<callback_name>', t.callback_name() )
-        typedefs += '\n'
-        return typedefs
+            compile_template( template_create_callback_typedef ).render_into( source_code, {
+                'typedef_name': t.typedef_name(),
+                'callback_type': t.callback_type(),
+                'callback_name': t.callback_name() } )
+        source_code.append( '\n' )
 
 
+    # Generator of the chunks declaring the unit test APIs
     def __create_mock_api_definitions( self, mock_apis ):
-        mock_definitions = ""
         adding_for_api_name = ''
         for mock in mock_apis:
-            api_definition = ''
             if adding_for_api_name != mock.mocked_api_name():
                 adding_for_api_name = mock.mocked_api_name()
                 if ( adding_for_api_name != 'mockcontrol' ):
-                    api_definition = '\n/* UnitTest APIs for %s() */\n'%( adding_for_api_name )
-                else:
-                    api_definition == '\n'
-            api_definition += '%s %s('%( mock.return_type(), mock.name() )
+                    yield '\n/* UnitTest APIs for %s() */\n'%( adding_for_api_name )
             params_string = mcmock_utils_convert_params_list_to_string( mock.parameters() )
-            api_definition += "%s)"%(params_string)
-            mock_definitions += "%s;\n"%( api_definition )
-        return mock_definitions
-
+            yield '%s %s(%s);\n'%( mock.return_type(), mock.name(), params_string )
@@ -0,0 +1,129 @@
+#!/usr/bin/python
+# @file header_fingerprint.py
+# @author matthew.denis.conway@gmail.com
+# @description Calculate a content fingerprint for a header to mock, used to
+# decide whether the mock generated for the header is still up to date
+
+
+import hashlib
+import json
+import os
+
+from parse_command import mcmock_version
+from include_resolver import IncludeResolver
+from c_tokenizer import tokenize_line, get_included_header
+from mcmock_utils import *
+
+
+# Digest of the sources of mcmock itself, so upgrading mcmock (or any change to
+# how it generates mocks) makes every mock out of date. Calculated the first
+# time a header is fingerprinted, then shared by every header in the run.
+generator_digest = None
+
+
+def get_generator_digest():
+    global generator_digest
+    if generator_digest is None:
+        digest = hashlib.sha1()
+        scripts_directory = os.path.dirname( os.path.abspath( __file__ ) )
+        if os.path.isdir( scripts_directory ):
+            for name in sorted( os.listdir( scripts_directory ) ):
+                if name.endswith( '.py' ):
+                    source_handle = open( os.path.join( scripts_directory, name ), "rb" )
+                    digest.update( name.encode( 'utf-8' ) + b'\0' + source_handle.read() + b'\0' )
+                    source_handle.close()
+        else:
+            # Running from the make_bundle.py zipapp, which holds the sources
+            import zipfile
+            bundle = zipfile.ZipFile( scripts_directory )
+            for name in sorted( bundle.namelist() ):
+                if name.endswith( '.py' ):
+                    digest.update( name.encode( 'utf-8' ) + b'\0' + bundle.read( name ) + b'\0' )
+            bundle.close()
+        generator_digest = digest.hexdigest()
+    return generator_digest
+
+
+class HeaderFingerprint:
+
+
+    # API to get the fingerprint (a hex digest string), or None if the header
+    # to mock could not be found
+    def get_fingerprint( self ):
+        return self.fingerprint
+
+
+    # API to get the paths of the files the mock is generated from (the header
+    # to mock and its included application headers). For a header which
+    # couldn't be found, every path it was searched for at is included, so the
+    # mock can be regenerated once it is created.
+    def get_dependencies( self ):
+        return self.dependencies
+
+
+    # The fingerprint covers everything that can change the generated mock:
+    # - The mcmock version, the sources of mcmock itself and the options used
+    #   to generate the mock
+    # - The content of the header to mock
+    # - The content of each application header it includes (found and resolved
+    #   the same way as GenerateMock finds and resolves them)
+    # The content is fingerprinted after comments and whitespace only lines
+    # are removed, so edits to either don't cause the mock to be regenerated.
+    # include_resolver = IncludeResolver shared by all the headers in a run (if
+    # not supplied, one is created for this header only)
+    def __init__( self, root_include_directory, header_to_mock, additional_include_directories, options, include_resolver=None ):
+        self.fingerprint = None
+        self.dependencies = []
+        if include_resolver is None:
+            include_resolver = IncludeResolver( [ root_include_directory ] + list( additional_include_directories ) )
+        header_path = include_resolver.find_header( header_to_mock )
+        self.__add_dependency( include_resolver, header_to_mock, header_path )
+        if header_path:
+            digest = hashlib.sha1()
+            self.__add_to_digest( digest, mcmock_version )
+            self.__add_to_digest( digest, get_generator_digest() )
+            self.__add_to_digest( digest, json.dumps( options, sort_keys=True ) )
+            self.__add_to_digest( digest, header_to_mock )
+            header_file_data = self.__read_normalised_file_data( header_path )
+            self.__add_to_digest( digest, "\n".join( header_file_data ) )
+            for included_header in self.__get_included_application_headers( header_file_data ):
+                path_to_included_header = include_resolver.find_header( included_header )
+                self.__add_to_digest( digest, included_header )
+                self.__add_to_digest( digest, path_to_included_header )
+                self.__add_dependency( include_resolver, included_header, path_to_included_header )
+                if path_to_included_header:
+                    self.__add_to_digest( digest, "\n".join( self.__read_normalised_file_data( path_to_included_header ) ) )
+            self.fingerprint = digest.hexdigest()
+
+
+    def __add_dependency( self, include_resolver, header, header_path ):
+        if header_path:
+            self.dependencies.append( header_path )
+        else:
+            self.dependencies.extend( include_resolver.get_search_paths( header ) )
+
+
+    def __add_to_digest( self, digest, data ):
+        # Terminate each item so the boundaries between items are part of the
+        # fingerprint too
+        digest.update( data.encode( 'utf-8' ) + b'\0' )
+
+
+    def __read_normalised_file_data( self, path ):
+        file_handle = open( path, "r" )
+        file_data = file_handle.readlines()
+        file_handle.close()
+        file_data = mcmock_utils_remove_comments( file_data )
+        return mcmock_utils_remove_whitespace_lines( file_data )
+
+
+    # The includes are recognised by the same tokeniser as PreParseCHeader uses;
+    # only lines which could be a directive are tokenised
+    def __get_included_application_headers( self, file_data ):
+        included_headers = []
+        for line in file_data:
+            if line.lstrip().startswith( '#' ):
+                included_header = get_included_header( tokenize_line( line ) )
+                if included_header is not None and included_header[1]:
+                    included_headers.append( included_header[0] )
+        return included_headers
@@ -0,0 +1,65 @@
+#!/usr/bin/python
+# @file include_resolver.py
+# @author matthew.denis.conway@gmail.com
+# @description Resolve header files against the include search path, using an
+# in-memory index of each include directory instead of probing the filesystem
+# for every lookup
+
+
+import os
+
+from mcmock_utils import *
+
+
+class IncludeResolver:
+
+
+    # API to find a header file; the include directories are searched in order
+    # and the path to the first match is returned (or '' if the header wasn't
+    # found)
+    def find_header( self, header ):
+        path = self.resolved.get( header )
+        if path is None:
+            path = ''
+            for include_dir in self.include_directories:
+                candidate = os.path.join( include_dir, header )
+                if os.path.basename( candidate ) in self.__list_directory( os.path.dirname( candidate ) ):
+                    path = candidate
+                    break
+            self.resolved[header] = path
+        return path
+
+
+    # API to get every path a header is searched for at, in search order
+    def get_search_paths( self, header ):
+        return [ os.path.join( include_dir, header ) for include_dir in self.include_directories ]
+
+
+    # API to get the include directories, in search order
+    def get_include_directories( self ):
+        return self.include_directories
+
+
+    def __init__( self, include_directories ):
+        self.include_directories = list( include_directories )
+        # Names of the files in each directory that has been listed
+        self.directory_listings = {}
+        # Result of each lookup
+        self.resolved = {}
+
+
+    def __list_directory( self, directory ):
+        directory = os.path.normpath( directory or '.' )
+        listing = self.directory_listings.get( directory )
+        if listing is None:
+            listing = set()
+            try:
+                for entry in os.scandir( directory ):
+                    if entry.is_file():
+                        listing.add( entry.name )
+            except OSError:
+                # The directory doesn't exist (or can't be read), so it can't
+                # contain the header
+                pass
+            self.directory_listings[directory] = listing
+        return listing
@@ -0,0 +1,170 @@
+#!/usr/bin/python
+# @file macro_expander.py
+# @author matthew.denis.conway@gmail.com
+# @description Expand the object-like and function-like macros used in a line
+# of C, using the symbols held by a SymbolTable
+
+
+from mcmock_types import TokenType
+from mcmock_utils import *
+from c_tokenizer import tokenize_line
+from c_splitter import find_closing_bracket, split_outside_brackets
+
+
+class MacroExpander:
+
+
+    # API to expand all the macros used in a line of C. Returns the expanded
+    # line, or None if the line ends part way through the argument list of a
+    # function-like macro (so the caller can join it with the next line and
+    # try again).
+    def expand_line( self, line ):
+        return self.__expand_text( line, frozenset() )
+
+
+    def __init__( self, symbol_table ):
+        self.symbol_table = symbol_table
+        # Expansions are memoized by macro name, arguments and the macros
+        # which can't be expanded (because they are already being expanded)
+        self.expansions = {}
+
+
+    def __get_macro( self, name, disabled ):
+        if name in disabled:
+            return None
+        return self.symbol_table.lookup_defined_symbol( name )
+
+
+    def __expand_text( self, text, disabled ):
+        tokens = tokenize_line( text ).tokens()
+        expanded = []
+        position = 0
+        i = 0
+        while i < len( tokens ):
+            token = tokens[i]
+            macro = None
+            if token.type() == TokenType.TOKEN_IDENTIFIER:
+                macro = self.__get_macro( token.text(), disabled )
+            if macro and macro.parameters() is None:
+                expanded.append( text[position:token.start()] )
+                expanded.append( self.__expand_macro( macro, (), disabled ) )
+                position = token.end()
+            elif macro and i + 1 < len( tokens ) and tokens[i+1].text() == '(':
+                arguments = self.__get_arguments( text, tokens, i + 1 )
+                if arguments is None:
+                    return None
+                if self.__arguments_match_parameters( macro, arguments['arguments'] ):
+                    expanded.append( text[position:token.start()] )
+                    expanded.append( self.__expand_macro( macro, tuple( arguments['arguments'] ), disabled ) )
+                    i = arguments['end']
+                    position = tokens[i].end()
+            i += 1
+        expanded.append( text[position:] )
+        return ''.join( expanded )
+
+
+    # Returns a dictionary containing:
+    # 'arguments' = list of the argument strings
+    # 'end' = index of the token closing the argument list
+    # or None if the argument list isn't closed
+    def __get_arguments( self, text, tokens, open_brace ):
+        close_brace = find_closing_bracket( text, tokens[open_brace].start() )
+        if close_brace < 0:
+            return None
+        arguments = [ argument.strip() for argument in split_outside_brackets( text[tokens[open_brace].end():close_brace] ) ]
+        i = open_brace
+        while tokens[i].start() < close_brace:
+            i += 1
+        return { 'arguments': arguments, 'end': i }
+
+
+    def __arguments_match_parameters( self, macro, arguments ):
+        parameters = macro.parameters()
+        if parameters and parameters[-1].endswith( '...' ):
+            return len( arguments ) >= len( parameters ) - 1
+        if not parameters:
+            return arguments == [ '' ]
+        return len( arguments ) == len( parameters )
+
+
+    def __expand_macro( self, macro, arguments, disabled ):
+        key = ( macro.name(), arguments, disabled )
+        expansion = self.expansions.get( key )
+        if expansion is None:
+            replacement = macro.replacement()
+            if macro.parameters():
+                replacement = self.__substitute_arguments( macro, arguments, disabled )
+            # Rescan the replacement for more macros, but the macro being
+            # expanded can't be expanded again
+            expansion = self.__expand_text( replacement, disabled | frozenset( [ macro.name() ] ) )
+            if expansion is None:
+                expansion = replacement
+            self.expansions[key] = expansion
+        return expansion
+
+
+    def __get_parameter_values( self, macro, arguments ):
+        values = {}
+        parameters = macro.parameters()
+        for i in range( len( parameters ) ):
+            parameter = parameters[i]
+            if parameter.endswith( '...' ):
+                # Variadic macro; the parameter takes all remaining arguments
+                name = parameter[0:-3] or '__VA_ARGS__'
+                values[name] = ', '.join( arguments[i:] )
+            else:
+                values[parameter] = arguments[i]
+        return values
+
+
+    def __stringify( self, argument ):
+        return '"' + argument.replace( '\\', '\\\\' ).replace( '"', '\\"' ) + '"'
+
+
+    # Replace the parameters in a function-like macro's replacement text with
+    # the arguments, handling the # (stringify) and ## (paste) operators
+    def __substitute_arguments( self, macro, arguments, disabled ):
+        values = self.__get_parameter_values( macro, arguments )
+        replacement = macro.replacement()
+        tokens = tokenize_line( replacement ).tokens()
+        substituted = []
+        position = 0
+        paste = False
+        i = 0
+        while i < len( tokens ):
+            token = tokens[i]
+            c = token.text()
+            if c == '##':
+                # Paste the tokens either side of ## together
+                substituted.append( replacement[position:token.start()].rstrip() )
+                position = token.end()
+                paste = True
+            else:
+                gap = replacement[position:token.start()]
+                if paste:
+                    gap = ''
+                if c == '#' and i + 1 < len( tokens ) and tokens[i+1].text() in values:
+                    substituted.append( gap + self.__stringify( values[tokens[i+1].text()] ) )
+                    i += 1
+                elif c in values:
+                    # Arguments are fully expanded before substitution, unless
+                    # they are operands of ##
+                    pasted = paste or ( i + 1 < len( tokens ) and tokens[i+1].text() == '##' )
+                    if pasted:
+                        substituted.append( gap + values[c] )
+                    else:
+                        substituted.append( gap + self.__expand_argument( values[c], disabled ) )
+                else:
+                    substituted.append( gap + c )
+                position = tokens[i].end()
+                paste = False
+            i += 1
+        substituted.append( replacement[position:] )
+        return ''.join( substituted )
+
+
+    def __expand_argument( self, argument, disabled ):
+        expanded = self.__expand_text( argument, disabled )
+        if expanded is None:
+            expanded = argument
+        return expanded
@@ -3,31 +3,405 @@
 # @author matthew.denis.conway@gmail.com
 # @description Public API for the mcmock application
 
+# Only the modules needed to parse the command are imported up front. The rest
+# (reading the headers to mock and deciding which mocks are up to date, the
+# parsers and generators, the process pool, the file watcher and the server) are
+# imported by the stage that needs them, so mcmock starts quickly.
 from parse_command import ParseCommand
-from generate_mock import GenerateMock
 from mcmock_utils import sprint, eprint, exit_on_error
 
 import os
+import sys
+from collections import deque
 
 
-def generate_mocks( command_data ):
-    for header in command_data.get_headers_to_mock():
-        sprint( "Generating Mock for %s"%( header ) )
+# Cache of pre-parsed included headers, shared by every header mocked by this
+# process during the run; created when the first header is mocked
+pre_parse_cache = None
+
+
+def get_pre_parse_cache():
+    global pre_parse_cache
+    if pre_parse_cache is None:
+        from pre_parse_cache import PreParseCache
+        pre_parse_cache = PreParseCache()
+    return pre_parse_cache
+
+
+# Include resolvers, one per include search path, shared by every header mocked
+# by this process during the run (so each include directory is only listed
+# once)
+include_resolvers = {}
+
+
+def get_include_resolver( root_include_directory, additional_includes ):
+    include_directories = tuple( [ root_include_directory ] + list( additional_includes ) )
+    include_resolver = include_resolvers.get( include_directories )
+    if include_resolver is None:
+        from include_resolver import IncludeResolver
+        include_resolver = IncludeResolver( include_directories )
+        include_resolvers[include_directories] = include_resolver
+    return include_resolver
+
+
+# profiler = StageProfiler for the header (None if it isn't being profiled)
+# preprocessor = CompilerPreprocessor for the header (None to use mcmock's own)
+# generation_date = date stamped into the mock ('' for none, None for today's)
+# write_depfile = whether to write a dependency file for the mock
+def generate_mock( root_include_directory, output_directory, header, additional_includes, profiler=None, preprocessor=None, generation_date=None, write_depfile=False ):
+    from generate_mock import GenerateMock
+    from c_tokenizer import age_tokenised_lines
+    sprint( "Generating Mock for %s"%( header ) )
+    # Nothing of the previous header is kept once its mock has been written,
+    # except what is shared by the headers (i.e. the pre-parse cache)
+    age_tokenised_lines()
+    if profiler is not None:
+        profiler.start()
+    try:
         mock_generator = \
             GenerateMock( \
-                command_data.get_root_include_directory(), \
-                command_data.get_output_directory(), \
+                root_include_directory, \
+                output_directory, \
                 header, \
-                command_data.get_additional_includes() )
+                additional_includes, \
+                get_pre_parse_cache(), \
+                get_include_resolver( root_include_directory, additional_includes ), \
+                profiler, \
+                preprocessor, \
+                generation_date, \
+                write_depfile )
+    finally:
+        if profiler is not None:
+            profiler.stop()
+    return mock_generator.get_generated_files()
+
+
+# Function to get the profile recorded by a header's profiler (None if it
+# wasn't profiled)
+def get_profile( profiler ):
+    if profiler is None:
+        return None
+    return profiler.get_profile()
+
+
+# Entry point for a worker process; returns the exit status, the recorded
+# output (instead of printing it), the generated files and the profile of the
+# header (if it was profiled).
+def generate_mock_in_worker( root_include_directory, output_directory, header, additional_includes, profiler=None, preprocessor=None, generation_date=None, write_depfile=False ):
+    from mock_output_recorder import MockOutputRecorder
+    recording = []
+    status = 0
+    generated_files = []
+    saved_streams = ( sys.stdout, sys.stderr )
+    sys.stdout = MockOutputRecorder( 'stdout', recording )
+    sys.stderr = MockOutputRecorder( 'stderr', recording )
+    try:
+        generated_files = generate_mock( root_include_directory, output_directory, header, additional_includes, profiler, preprocessor, generation_date, write_depfile )
+    except SystemExit as e:
+        status = e.code if isinstance( e.code, int ) else 1
+    except Exception:
+        import traceback
+        sys.stderr.write( traceback.format_exc() )
+        status = 1
+    finally:
+        sys.stdout, sys.stderr = saved_streams
+    return ( status, recording, generated_files, get_profile( profiler ) )
+
+
+def replay_worker_output( recording ):
+    for stream_name, text in recording:
+        if stream_name == 'stdout':
+            sys.stdout.write( text )
+        else:
+            sys.stderr.write( text )
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+
+def get_header_file_size( root_include_directory, header, additional_includes ):
+    header_path = get_include_resolver( root_include_directory, additional_includes ).find_header( header )
+    if header_path:
+        return os.path.getsize( header_path )
+    return 0
+
+
+# Options which change the generated mock, so are part of each header's
+# fingerprint
+def get_generation_options( target ):
+    options = {
+        'root_include_directory': target['root_include_directory'],
+        'additional_includes': target['additional_includes']
+    }
+    if target['preprocessor'] is not None:
+        include_resolver = get_include_resolver( target['root_include_directory'], target['additional_includes'] )
+        header_path = include_resolver.find_header( target['header'] )
+        if header_path:
+            options.update( target['preprocessor'].get_options( target['header'], header_path, include_resolver.get_include_directories() ) )
+    # Today's date isn't included, so a mock isn't regenerated just because the
+    # day has changed
+    if target['generation_date'] is not None:
+        options['generation_date'] = target['generation_date']
+    if target['depfile']:
+        options['depfile'] = True
+    return options
+
+
+def create_header_fingerprint( target ):
+    from header_fingerprint import HeaderFingerprint
+    return HeaderFingerprint(
+        target['root_include_directory'],
+        target['header'],
+        target['additional_includes'],
+        get_generation_options( target ),
+        get_include_resolver( target['root_include_directory'], target['additional_includes'] ) )
+
+
+def get_header_fingerprint( target ):
+    return create_header_fingerprint( target ).get_fingerprint()
+
+
+def skip_up_to_date_mock( header ):
+    sprint( "Mock for %s is up to date, skipping"%( header ) )
+
+
+# Each output directory has its own manifest, loaded the first time a header
+# is mocked into that directory
+def get_manifest( manifests, output_directory ):
+    manifest = manifests.get( output_directory )
+    if manifest is None:
+        from mock_manifest import MockManifest
+        manifest = MockManifest( output_directory )
+        manifests[output_directory] = manifest
+    return manifest
+
+
+# Replays the results of the submitted mocks in the order the headers were
+# read, so the log and exit status match a serial run. If wait is False, stops
+# at the first mock which hasn't finished yet. When a header fails, the mocks
+# which haven't started are cancelled, but those already being generated by
+# other workers still finish, so (unlike a serial run) mocks of headers after
+# the failed one may have been written; they aren't recorded in the manifest,
+# so are generated again by the next run.
+def report_parallel_mocks( pending, executor, wait, generated_files, profile_report ):
+    while pending and ( wait or pending[0]['future'] is None or pending[0]['future'].done() ):
+        mock = pending.popleft()
+        if mock['future'] is None:
+            skip_up_to_date_mock( mock['target']['header'] )
+            generated_files.extend( mock['manifest'].get_generated_files( mock['target']['header'] ) )
+            continue
+        status, recording, generated_mock_files, profile = mock['future'].result()
+        replay_worker_output( recording )
+        if status:
+            for remaining in pending:
+                if remaining['future'] is not None:
+                    remaining['future'].cancel()
+            executor.shutdown()
+            sys.exit( status )
+        mock['manifest'].update( mock['target']['header'], mock['fingerprint'], generated_mock_files )
+        generated_files.extend( generated_mock_files )
+        profile_report.add( profile )
+
+
+def generate_mocks_in_parallel( target_groups, manifests, jobs, generated_files, profile_report ):
+    from concurrent.futures import ProcessPoolExecutor
+    executor = ProcessPoolExecutor( max_workers=jobs )
+    pending = deque()
+    for targets in target_groups:
+        # Schedule the largest headers first so a single huge header is not
+        # left running on its own after every other job has finished.
+        sizes = [ get_header_file_size( target['root_include_directory'], target['header'], target['additional_includes'] ) for target in targets ]
+        schedule = sorted( range( len( targets ) ), key=lambda index: sizes[index], reverse=True )
+        group = [ None ] * len( targets )
+        for index in schedule:
+            target = targets[index]
+            manifest = get_manifest( manifests, target['output_directory'] )
+            fingerprint = get_header_fingerprint( target )
+            future = None
+            if not manifest.is_up_to_date( target['header'], fingerprint ):
+                future = executor.submit(
+                    generate_mock_in_worker,
+                    target['root_include_directory'],
+                    target['output_directory'],
+                    target['header'],
+                    target['additional_includes'],
+                    profile_report.create_stage_profiler( target['header'] ),
+                    target['preprocessor'],
+                    target['generation_date'],
+                    target['depfile'] )
+            group[index] = { 'target': target, 'manifest': manifest, 'fingerprint': fingerprint, 'future': future }
+        pending.extend( group )
+        # Report whatever has finished while the next headers are read
+        report_parallel_mocks( pending, executor, False, generated_files, profile_report )
+    report_parallel_mocks( pending, executor, True, generated_files, profile_report )
+    executor.shutdown()
+
+
+def generate_mocks_in_series( target_groups, manifests, generated_files, profile_report ):
+    for targets in target_groups:
+        for target in targets:
+            manifest = get_manifest( manifests, target['output_directory'] )
+            fingerprint = get_header_fingerprint( target )
+            if manifest.is_up_to_date( target['header'], fingerprint ):
+                skip_up_to_date_mock( target['header'] )
+                generated_files.extend( manifest.get_generated_files( target['header'] ) )
+                continue
+            profiler = profile_report.create_stage_profiler( target['header'] )
+            generated_mock_files = generate_mock(
+                target['root_include_directory'],
+                target['output_directory'],
+                target['header'],
+                target['additional_includes'],
+                profiler,
+                target['preprocessor'],
+                target['generation_date'],
+                target['depfile'] )
+            manifest.update( target['header'], fingerprint, generated_mock_files )
+            generated_files.extend( generated_mock_files )
+            profile_report.add( get_profile( profiler ) )
+
+
+# Generates the mocks, returning the paths of the mock files (including those
+# of mocks which were already up to date)
+def generate_mocks( command_data ):
+    from mock_target_reader import MockTargetReader
+    from mock_profile_report import MockProfileReport
+    # Headers are read (from the command line, response files, manifests or
+    # stdin) while they are being mocked, so the number of headers isn't known
+    # up front
+    target_groups = MockTargetReader( command_data ).get_target_groups()
+    manifests = {}
+    generated_files = []
+    profile_report = MockProfileReport( command_data.get_profile_file(), command_data.get_cprofile_directory() )
+    try:
+        jobs = command_data.get_jobs()
+        if all( source_type == 'headers' for source_type, value in command_data.get_header_sources() ):
+            jobs = min( jobs, len( command_data.get_headers_to_mock() ) )
+        if jobs > 1:
+            generate_mocks_in_parallel( target_groups, manifests, jobs, generated_files, profile_report )
+        else:
+            generate_mocks_in_series( target_groups, manifests, generated_files, profile_report )
+    finally:
+        # Record the mocks generated so far, even if a header failed
+        for manifest in manifests.values():
+            manifest.save()
+        profile_report.save()
+    return generated_files
+
+
+# Generates the mock for a watched header, returning the paths of the files the
+# mock depends on. A header that fails to mock doesn't stop the watch, it is
+# mocked again when it (or a header it includes) changes.
+def generate_watched_mock( target, manifests, profile_report ):
+    header_fingerprint = create_header_fingerprint( target )
+    manifest = get_manifest( manifests, target['output_directory'] )
+    if manifest.is_up_to_date( target['header'], header_fingerprint.get_fingerprint() ):
+        skip_up_to_date_mock( target['header'] )
+    else:
+        try:
+            profiler = profile_report.create_stage_profiler( target['header'] )
+            generated_files = generate_mock(
+                target['root_include_directory'],
+                target['output_directory'],
+                target['header'],
+                target['additional_includes'],
+                profiler,
+                target['preprocessor'],
+                target['generation_date'],
+                target['depfile'] )
+            manifest.update( target['header'], header_fingerprint.get_fingerprint(), generated_files )
+            profile_report.add( get_profile( profiler ) )
+        except SystemExit:
+            eprint( "WARNING: Failed to generate the mock for %s, waiting for it to change"%( target['header'] ) )
+        except Exception:
+            import traceback
+            eprint( traceback.format_exc() )
+            eprint( "WARNING: Failed to generate the mock for %s, waiting for it to change"%( target['header'] ) )
+    dependencies = list( header_fingerprint.get_dependencies() )
+    if target['preprocessor'] is not None:
+        dependencies.extend( target['preprocessor'].get_dependencies( target['header'] ) )
+    return set( [ os.path.abspath( dependency ) for dependency in dependencies ] )
+
+
+# Mocks the headers, then keeps running and mocks them again whenever the files
+# they depend on change. Only the mocks affected by a change are regenerated;
+# everything cached by this process (pre-parsed included headers, recently
+# tokenised lines, compiled conditional expressions) is kept between changes. The
+# --profile file holds the profiles of the mocks last regenerated.
+def watch_mocks( command_data ):
+    from file_watcher import FileWatcher
+    from mock_target_reader import MockTargetReader
+    from mock_profile_report import MockProfileReport
+    targets = []
+    dependencies = []
+    manifests = {}
+    profile_report = MockProfileReport( command_data.get_profile_file(), command_data.get_cprofile_directory() )
+    try:
+        for target_group in MockTargetReader( command_data ).get_target_groups():
+            for target in target_group:
+                targets.append( target )
+                dependencies.append( generate_watched_mock( target, manifests, profile_report ) )
+    finally:
+        for manifest in manifests.values():
+            manifest.save()
+        profile_report.save()
+    watcher = FileWatcher()
+    while True:
+        watched_files = set().union( *dependencies )
+        watcher.watch( watched_files )
+        sprint( "Watching %d files for changes (using %s), press Ctrl+C to stop"%( len( watched_files ), watcher.get_method() ) )
+        changed = watcher.wait_for_changes()
+        for path in sorted( changed ):
+            sprint( "Changed: %s"%( path ) )
+        # Headers may have been created, deleted or renamed, so the include
+        # directories must be listed again
+        include_resolvers.clear()
+        manifests = {}
+        profile_report = MockProfileReport( command_data.get_profile_file(), command_data.get_cprofile_directory() )
+        try:
+            for index in range( len( targets ) ):
+                if dependencies[index] & changed:
+                    dependencies[index] = generate_watched_mock( targets[index], manifests, profile_report )
+        finally:
+            for manifest in manifests.values():
+                manifest.save()
+            profile_report.save()
+
+
+# Runs a request sent to the server, returning a tuple of ( status, paths of
+# the mock files )
+def run_request( argv ):
+    command_data = ParseCommand( argv )
+    if command_data.get_command_errors():
+        exit_on_error( command_data.get_command_errors() )
+    elif command_data.get_server_socket() or command_data.watch_for_changes():
+        exit_on_error( "ERROR: --serve and --watch can't be used in a request to the server" )
+    elif not command_data.get_header_sources():
+        exit_on_error( command_data.get_help_message() )
+    # Headers may have been created, deleted or renamed since the last request,
+    # so the include directories must be listed again
+    include_resolvers.clear()
+    generated_files = generate_mocks( command_data )
+    return ( 0, [ os.path.realpath( generated_file ) for generated_file in generated_files ] )
 
 
 def run_from_cmd_line( argv ):
     command_data = ParseCommand( argv )
     if command_data.get_command_errors():
         exit_on_error( command_data.get_command_errors() )
-    elif not command_data.get_headers_to_mock():
+    elif command_data.get_server_socket():
+        from mock_server import MockServer
+        try:
+            MockServer( command_data.get_server_socket(), run_request ).serve_forever()
+        except KeyboardInterrupt:
+            sprint( "Stopped serving mock requests" )
+    elif not command_data.get_header_sources():
         exit_on_error( command_data.get_help_message() )
     elif command_data.show_help_message():
         sprint( command_data.get_help_message() )
+    elif command_data.watch_for_changes():
+        try:
+            watch_mocks( command_data )
+        except KeyboardInterrupt:
+            sprint( "Stopped watching for changes" )
     else:
         generate_mocks( command_data )
@@ -5,6 +5,13 @@
 
 
 from enum import Enum
+from sys import intern
+
+
+# The classes describing the parsed headers use __slots__ (rather than a
+# __dict__ per instance), and intern the type and identifier strings they hold;
+# the same few types (i.e. 'uint32_t', 'const char *') and names are repeated
+# thousands of times across the headers of a project.
 
 # List of things that can be typedef'd in C
 class TypedefType(Enum):
@@ -30,6 +37,8 @@ class TypedefType(Enum):
 # Class to encapsulate a typedef
 class Typedef:
 
+    __slots__ = ( '_type', '_name', '_data' )
+
     def type( self ):
         return self._type
 
@@ -41,7 +50,7 @@ class Typedef:
 
     def __init__( self, type, name, data ):
         self._type = type
-        self._name = name
+        self._name = intern( name )
         self._data = data
 
 #CallbackTypedef (
@@ -54,6 +63,8 @@ class Typedef:
 # Class to encapsulate a typedef describing a callback (function pointer)
 class CallbackTypedef:
 
+    __slots__ = ( '_typedef_name', '_callback_type', '_callback_name', '_function_name' )
+
     def typedef_name( self ):
         return self._typedef_name
 
@@ -67,24 +78,40 @@ class CallbackTypedef:
         return self._function_name
 
     def __init__( self, typedef_name, callback_type, callback_name, function_name ):
-        self._typedef_name = typedef_name
-        self._callback_type = callback_type
-        self._callback_name = callback_name
-        self._function_name = function_name
+        self._typedef_name = intern( typedef_name )
+        self._callback_type = intern( callback_type )
+        self._callback_name = intern( callback_name )
+        self._function_name = intern( function_name )
 
 
 # Class to encapsulate a defined symbol
 class DefinedSymbol:
 
+    __slots__ = ( '_name', '_value', '_parameters', '_replacement' )
+
     def name( self ):
         return self._name
 
     def value( self ):
         return self._value
 
-    def __init__( self, name, value ):
-        self._name = name
+    # List of parameter names of a function-like macro, or None if the symbol
+    # is an object-like macro
+    def parameters( self ):
+        return self._parameters
+
+    # The text the macro is replaced with (the value without the parameter
+    # list of a function-like macro)
+    def replacement( self ):
+        return self._replacement
+
+    def __init__( self, name, value, parameters=None, replacement=None ):
+        self._name = intern( name )
         self._value = value
+        self._parameters = parameters
+        if replacement is None:
+            replacement = value
+        self._replacement = replacement
 
 
 
@@ -129,6 +156,8 @@ class ParameterType(Enum):
 # Class to encapsulate data describing a function parameter
 class Parameter:
 
+    __slots__ = ( '_type', '_data_type', '_name' )
+
     def type( self ):
         return self._type
 
@@ -145,13 +174,15 @@ class Parameter:
     # name = The parameters name (i.e. "house_number")
     def __init__( self, type, data_type, name ):
         self._type = type
-        self._data_type = data_type
-        self._name = name
+        self._data_type = intern( data_type )
+        self._name = intern( name )
 
 
 # Class to encapsulate data describing a function definition
 class Function:
 
+    __slots__ = ( '_name', '_return_type', '_parameter_list' )
+
     def name( self ):
         return self._name
 
@@ -166,14 +197,16 @@ class Function:
     # parameter_list = List of <Parameter> objects, one for each parameter of
     # the function pointer.
     def __init__( self, name, return_type, parameter_list ):
-        self._name = name
-        self._return_type = return_type
+        self._name = intern( name )
+        self._return_type = intern( return_type )
         self._parameter_list = parameter_list
 
 
 # Class to encapsulate data describing a mock function definition
 class MockFunction( Function ):
 
+    __slots__ = ( '_mock_type', '_mocked_api_name' )
+
     def mock_type( self ):
         return self._mock_type
 
@@ -185,7 +218,74 @@ class MockFunction( Function ):
     def __init__( self, name, return_type, parameter_list, mock_type, mocked_api_name ):
         Function.__init__( self, name, return_type, parameter_list )
         self._mock_type = mock_type
-        self._mocked_api_name = mocked_api_name
+        self._mocked_api_name = intern( mocked_api_name )
+
+
+
+
+
+# List of types of token produced by the C tokenizer
+class TokenType(Enum):
+    TOKEN_IDENTIFIER = 0    # Identifier or keyword (i.e. 'int', 'my_function')
+    TOKEN_NUMBER = 1        # Numeric literal (i.e. '10', '0x1FUL', '1.5e3')
+    TOKEN_STRING = 2        # String literal, including the quotes
+    TOKEN_CHARACTER = 3     # Character literal, including the quotes
+    TOKEN_PUNCTUATOR = 4    # Punctuation and operators (i.e. '(', '->', '#')
+    TOKEN_UNKNOWN = 5       # Any other character
+
+
+# Class to encapsulate a token found in a line of C
+class Token:
+
+    __slots__ = ( '_type', '_text', '_start', '_end' )
+
+    def type( self ):
+        return self._type
+
+    def text( self ):
+        return self._text
+
+    # Index of the first character of the token in the line
+    def start( self ):
+        return self._start
+
+    # Index after the last character of the token in the line
+    def end( self ):
+        return self._end
+
+    def __init__( self, type, text, start, end ):
+        self._type = type
+        self._text = text
+        self._start = start
+        self._end = end
+
+
+# Class to encapsulate a tokenised line of C
+class SourceLine:
+
+    __slots__ = ( '_text', '_tokens', '_directive', '_directive_argument' )
+
+    def text( self ):
+        return self._text
+
+    def tokens( self ):
+        return self._tokens
 
+    # The name of the pre-processor directive on the line (i.e. 'define',
+    # 'ifdef'), or None if the line isn't a pre-processor directive
+    def directive( self ):
+        return self._directive
 
+    # The text following the name of the pre-processor directive, i.e.
+    # 'defined( FOO )' for the line '#if defined( FOO )'
+    def directive_argument( self ):
+        return self._directive_argument
 
+    def __init__( self, text, tokens ):
+        self._text = text
+        self._tokens = tokens
+        self._directive = None
+        self._directive_argument = ''
+        if len( tokens ) > 1 and tokens[0].text() == '#' and tokens[1].type() == TokenType.TOKEN_IDENTIFIER:
+            self._directive = tokens[1].text()
+            self._directive_argument = text[tokens[1].end():].strip()
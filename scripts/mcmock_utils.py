@@ -5,11 +5,12 @@
 
 
 from __future__ import print_function
+import re
 import sys
-from mcmock_types import Parameter, ParameterType
 
 
 def mcmock_utils_convert_params_list_to_string( parameters ):
+    from mcmock_types import ParameterType
     parameter_string = ' '
     i=0
     if len(parameters) == 0:
@@ -40,6 +41,59 @@ def mcmock_utils_strip_constness( variable_data_type ):
     return result
 
 
+# A string or character literal (kept as it is, so "//" or "/*" inside one
+# isn't taken for a comment), or a line comment, or a block comment (the
+# unrolled form matches in a single pass with no backtracking; one that is
+# never closed runs to the end of the file)
+comment_or_literal_regex = re.compile( r"""
+    ( "(?:[^"\\\n]|\\.)*" | '(?:[^'\\\n]|\\.)*' )
+    | //[^\n]*
+    | /\*[^*]*\*+(?:[^/*][^*]*\*+)*/
+    | /\*[\s\S]*
+    """, re.VERBOSE )
+
+
+def replace_comment( matched ):
+    literal = matched.group( 1 )
+    if literal is not None:
+        return literal
+    # The comment is replaced by a space (as a C pre-processor would), or by
+    # the line breaks it spanned, so the remaining lines keep their numbers
+    line_breaks = matched.group().count( '\n' )
+    if line_breaks:
+        return '\n' * line_breaks
+    return ' '
+
+
+# Function to remove all C comments from the file data (a list of lines),
+# returning the remaining file data as a list of lines; there is a line for
+# every line of the file data (lines which were all comment are left empty)
+def mcmock_utils_remove_comments( file_data ):
+    return comment_or_literal_regex.sub( replace_comment, ''.join( file_data ) ).splitlines()
+
+
+# Function to remove all lines that only contain whitespace from the file data,
+# the remaining lines are stripped of leading and trailing whitespace
+def mcmock_utils_remove_whitespace_lines( file_data ):
+    stripped = []
+    for line in file_data:
+        line = line.strip()
+        if line:
+            stripped.append( line )
+    return stripped
+
+
+# Function to get the date stamped into the generated files (dd/mm/yyyy), of
+# today, or of a timestamp (seconds since the epoch, i.e. SOURCE_DATE_EPOCH)
+def mcmock_utils_get_generation_date( timestamp=None ):
+    from datetime import datetime, timezone
+    if timestamp is None:
+        date = datetime.now()
+    else:
+        date = datetime.fromtimestamp( timestamp, timezone.utc )
+    return "%02d/%02d/%04d"%( date.day, date.month, date.year )
+
+
 # Function to print to stderr and terminate
 def exit_on_error( *args, **kwargs ):
     print("mCmock:",*args, file=sys.stderr, **kwargs)
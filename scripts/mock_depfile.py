@@ -0,0 +1,55 @@
+#!/usr/bin/python
+# @file mock_depfile.py
+# @author matthew.denis.conway@gmail.com
+# @description Write a Makefile syntax dependency file (as cc -MD -MP does) for
+# a generated mock, listing every file the mock was generated from, so make or
+# ninja only run mcmock again when one of them changes
+
+
+import os.path
+
+from mock_file_writer import MockFileWriter
+from mcmock_utils import *
+
+
+# Function to escape a path for a Makefile rule (ninja reads the same escapes);
+# the path is normalised first, as make matches targets and prerequisites by
+# name (i.e. out//mock_a.h is a different file to out/mock_a.h)
+def escape_make_path( path ):
+    path = os.path.normpath( path )
+    return path.replace( '$', '$$' ).replace( '#', '\\#' ).replace( ' ', '\\ ' )
+
+
+class MockDepfile:
+
+
+    # API to write the dependency file; returns True if the file was written,
+    # False if it already held the same dependencies
+    def write( self ):
+        return MockFileWriter( self.depfile_path ).write( self.__get_chunks() )
+
+
+    # depfile_path = where to write the dependency file
+    # target_files = the generated mock files
+    # input_files = the files the mock was generated from, the header to mock
+    # first
+    def __init__( self, depfile_path, target_files, input_files ):
+        self.depfile_path = depfile_path
+        self.target_files = target_files
+        self.input_files = []
+        for input_file in input_files:
+            input_file = os.path.normpath( input_file )
+            if input_file not in self.input_files:
+                self.input_files.append( input_file )
+
+
+    # The rule for the generated files, followed by an empty rule for each file
+    # other than the header to mock, so deleting a header the header to mock
+    # no longer includes doesn't break the build
+    def __get_chunks( self ):
+        yield ' '.join( [ escape_make_path( target_file ) for target_file in self.target_files ] ) + ':'
+        for input_file in self.input_files:
+            yield ' \\\n  ' + escape_make_path( input_file )
+        yield '\n'
+        for input_file in self.input_files[1:]:
+            yield '\n' + escape_make_path( input_file ) + ':\n'
@@ -0,0 +1,120 @@
+#!/usr/bin/python
+# @file mock_file_writer.py
+# @author matthew.denis.conway@gmail.com
+# @description Write a generated file atomically; the content is streamed to a
+# temporary file next to the destination, which is then renamed into place, so
+# the destination never holds a partially written file. A file whose content
+# hasn't changed is left untouched.
+
+
+import locale
+import os
+import stat
+import tempfile
+
+from mcmock_utils import *
+
+
+# Chunks are collected into writes of (at least) this many characters
+write_buffer_size = 64 * 1024
+
+
+# The file is written as bytes, encoded as open() would encode it in text mode,
+# so it can be compared byte for byte with the existing file
+file_encoding = locale.getpreferredencoding( False )
+
+
+# Function to encode text as open() would write it in text mode
+def encode_text( text ):
+    if os.linesep != '\n':
+        text = text.replace( '\n', os.linesep )
+    return text.encode( file_encoding )
+
+
+# Permissions given to new files (the same as open() would give them)
+def get_new_file_mode():
+    umask = os.umask( 0 )
+    os.umask( umask )
+    return 0o666 & ~umask
+
+
+# Reading the umask means changing it, so it is only read once, when mcmock
+# starts to write files
+new_file_mode = get_new_file_mode()
+
+
+class MockFileWriter:
+
+
+    # API to write the file from an iterable of chunks (i.e. a generator); the
+    # chunks are written as they are produced. If writing fails, the file is
+    # left as it was. If the file already holds exactly this content, it isn't
+    # replaced, so its modification time doesn't change and nothing built from
+    # it is rebuilt. Returns True if the file was written, False if it was
+    # already up to date.
+    def write( self, chunks ):
+        directory = os.path.dirname( self.path ) or '.'
+        file_descriptor, temp_path = tempfile.mkstemp( dir=directory, prefix='.' + os.path.basename( self.path ) + '.', suffix='.tmp' )
+        try:
+            # The content is compared with the existing file as it is written,
+            # so neither has to be held in memory whole
+            existing_handle = self.__open_existing_file()
+            is_unchanged = existing_handle is not None
+            try:
+                temp_handle = os.fdopen( file_descriptor, "wb" )
+                try:
+                    buffered = []
+                    buffered_size = 0
+                    for chunk in chunks:
+                        buffered.append( chunk )
+                        buffered_size += len( chunk )
+                        if buffered_size >= write_buffer_size:
+                            data = encode_text( ''.join( buffered ) )
+                            temp_handle.write( data )
+                            if is_unchanged:
+                                is_unchanged = existing_handle.read( len( data ) ) == data
+                            buffered = []
+                            buffered_size = 0
+                    data = encode_text( ''.join( buffered ) )
+                    temp_handle.write( data )
+                    if is_unchanged:
+                        is_unchanged = existing_handle.read( len( data ) ) == data and not existing_handle.read( 1 )
+                finally:
+                    temp_handle.close()
+            finally:
+                if existing_handle is not None:
+                    existing_handle.close()
+            if is_unchanged:
+                os.remove( temp_path )
+                return False
+            os.chmod( temp_path, self.__get_file_mode() )
+            os.replace( temp_path, self.path )
+        except BaseException:
+            if os.path.exists( temp_path ):
+                os.remove( temp_path )
+            raise
+        return True
+
+
+    def __init__( self, path ):
+        self.path = path
+
+
+    # Returns the permissions to give the file; a file being replaced keeps its
+    # own permissions (i.e. if it was made read-only), a new file gets the
+    # same permissions as open() would give it
+    def __get_file_mode( self ):
+        try:
+            return stat.S_IMODE( os.stat( self.path ).st_mode )
+        except OSError:
+            return new_file_mode
+
+
+    # Opens the existing file to compare the new content with (as bytes, so a
+    # file which only differs in its line endings is still replaced), returns
+    # None if there is no existing file
+    def __open_existing_file( self ):
+        try:
+            return open( self.path, "rb" )
+        except OSError:
+            return None
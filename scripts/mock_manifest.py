@@ -0,0 +1,73 @@
+#!/usr/bin/python
+# @file mock_manifest.py
+# @author matthew.denis.conway@gmail.com
+# @description Manifest stored in the output directory recording the
+# fingerprint of each mocked header, so unchanged headers can be skipped
+
+
+import json
+import os.path
+
+from mcmock_utils import *
+
+
+manifest_file_name = '.mcmock_manifest.json'
+
+
+class MockManifest:
+
+
+    # API to check whether the mock for a header was generated from content
+    # matching the fingerprint, and the generated files still exist
+    def is_up_to_date( self, header, fingerprint ):
+        entry = self.headers.get( header )
+        if not fingerprint or not entry or entry['fingerprint'] != fingerprint:
+            return False
+        for generated_file in entry['generated_files']:
+            if not os.path.isfile( generated_file ):
+                return False
+        return True
+
+
+    # API to get the files generated for a header (when its mock was last
+    # generated)
+    def get_generated_files( self, header ):
+        entry = self.headers.get( header )
+        if not entry:
+            return []
+        return list( entry['generated_files'] )
+
+
+    # API to record the fingerprint of a header after its mock was generated
+    def update( self, header, fingerprint, generated_files ):
+        if fingerprint:
+            self.headers[header] = { 'fingerprint': fingerprint, 'generated_files': [ os.path.realpath( f ) for f in generated_files ] }
+            self.modified = True
+
+
+    # API to write the manifest back to the output directory (only if any of
+    # the headers were updated)
+    def save( self ):
+        if self.modified:
+            # Only imported when there is something to write, as it isn't
+            # needed to start mcmock
+            from mock_file_writer import MockFileWriter
+            # Written atomically, so a run which is killed part way through
+            # never leaves a corrupt manifest behind
+            MockFileWriter( self.manifest_path ).write( json.JSONEncoder( indent=1, sort_keys=True ).iterencode( { 'headers': self.headers } ) )
+            self.modified = False
+
+
+    def __init__( self, output_directory ):
+        self.manifest_path = os.path.join( output_directory, manifest_file_name )
+        self.headers = {}
+        self.modified = False
+        if os.path.isfile( self.manifest_path ):
+            manifest_handle = open( self.manifest_path, "r" )
+            manifest_data = manifest_handle.read()
+            manifest_handle.close()
+            try:
+                self.headers = json.loads( manifest_data )['headers']
+            except ( ValueError, KeyError, TypeError ):
+                eprint( "WARNING: Ignoring invalid manifest file: ", self.manifest_path )
+                self.headers = {}
@@ -0,0 +1,21 @@
+#!/usr/bin/python
+# @file mock_output_recorder.py
+# @author matthew.denis.conway@gmail.com
+# @description Stream which records everything written to stdout/stderr, so it
+# can be replayed (or sent back to a client) later
+
+
+# Records everything written to stdout/stderr while a header is mocked inside a
+# worker process (or for a client of the server), so it can be replayed in the
+# same order a serial run would have printed it.
+class MockOutputRecorder:
+
+    def __init__( self, stream_name, recording ):
+        self.stream_name = stream_name
+        self.recording = recording
+
+    def write( self, text ):
+        self.recording.append( ( self.stream_name, text ) )
+
+    def flush( self ):
+        pass
@@ -0,0 +1,52 @@
+#!/usr/bin/python
+# @file mock_profile_report.py
+# @author matthew.denis.conway@gmail.com
+# @description Collect the profiles of the headers mocked in a run (--profile
+# and --cprofile) and write them to a JSON file
+
+
+import json
+import os.path
+
+
+class MockProfileReport:
+
+
+    # API to create the profiler for a header, returns None if nothing is being
+    # profiled
+    def create_stage_profiler( self, header ):
+        if not self.profile_path and not self.cprofile_directory:
+            return None
+        from stage_profiler import StageProfiler
+        cprofile_path = ''
+        if self.cprofile_directory:
+            cprofile_path = os.path.join( self.cprofile_directory, header.replace( '/', '_' ) + '.prof' )
+        return StageProfiler( header, True, cprofile_path )
+
+
+    # API to add the profile of a mocked header (None is ignored)
+    def add( self, profile ):
+        if profile is not None:
+            self.profiles.append( profile )
+
+
+    # API to write the profiles to the --profile file (if one was given), with
+    # the totals of the counts of every header (i.e. the pre-parse cache hits
+    # and misses of the run)
+    def save( self ):
+        if self.profile_path:
+            from mock_file_writer import MockFileWriter
+            counts = {}
+            for profile in self.profiles:
+                for name, count in profile['counts'].items():
+                    counts[name] = counts.get( name, 0 ) + count
+            MockFileWriter( self.profile_path ).write( json.JSONEncoder( indent=1 ).iterencode( { 'headers': self.profiles, 'counts': counts } ) )
+
+
+    # profile_path = JSON file to write the profiles to ('' for none)
+    # cprofile_directory = directory to write the cProfile statistics of each
+    # header to ('' for none)
+    def __init__( self, profile_path, cprofile_directory ):
+        self.profile_path = profile_path
+        self.cprofile_directory = cprofile_directory
+        self.profiles = []
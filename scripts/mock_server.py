@@ -0,0 +1,138 @@
+#!/usr/bin/python
+# @file mock_server.py
+# @author matthew.denis.conway@gmail.com
+# @description Serve requests to generate mocks over a Unix socket, so a build
+# system can generate many mocks without starting a new mcmock process (and
+# parsing every included header again) for each one
+
+
+import io
+import json
+import os
+import signal
+import socket
+import stat
+import sys
+import traceback
+
+from mock_output_recorder import MockOutputRecorder
+from mcmock_utils import *
+
+
+# Every request and response is a single line of JSON.
+#
+# Request:
+#   { "argv": [ "mcmock.py", "-o", ... ],   - the mcmock command line
+#     "cwd": "/path",                       - directory to run the command in
+#     "stdin": "..." }                      - (optional) stdin for --stdin
+#
+# Response:
+#   { "status": 0,                          - the mcmock exit status
+#     "output": [ [ "stdout", "..." ] ],    - everything mcmock printed, in order
+#     "generated_files": [ "/path" ] }      - paths of the mock files
+class MockServer:
+
+
+    # API to serve requests until interrupted; requests are served one at a
+    # time, in the order they arrive
+    def serve_forever( self ):
+        sprint( "Serving mock requests on %s, press Ctrl+C to stop"%( self.socket_path ) )
+        # Terminating the server stops it as Ctrl+C does, so the request being
+        # served fails (rather than being mistaken for mcmock exiting) and the
+        # socket is removed
+        signal.signal( signal.SIGTERM, self.__terminate )
+        try:
+            while True:
+                connection = self.server_socket.accept()[0]
+                try:
+                    self.__serve_connection( connection )
+                except ( IOError, OSError, ValueError ) as e:
+                    eprint( "WARNING: Failed to serve request: ", e )
+                finally:
+                    connection.close()
+        finally:
+            self.server_socket.close()
+            os.remove( self.socket_path )
+
+
+    # request_handler = function called with the command line of a request,
+    # which returns a tuple of ( status, generated files )
+    def __init__( self, socket_path, request_handler ):
+        self.socket_path = socket_path
+        self.request_handler = request_handler
+        self.__remove_stale_socket()
+        self.server_socket = socket.socket( socket.AF_UNIX, socket.SOCK_STREAM )
+        # Only the user running the server may send it requests
+        saved_umask = os.umask( 0o077 )
+        try:
+            self.server_socket.bind( socket_path )
+        finally:
+            os.umask( saved_umask )
+        self.server_socket.listen( 16 )
+
+
+    def __terminate( self, signal_number, frame ):
+        raise KeyboardInterrupt()
+
+
+    def __remove_stale_socket( self ):
+        if not os.path.exists( self.socket_path ):
+            return
+        if not stat.S_ISSOCK( os.stat( self.socket_path ).st_mode ):
+            exit_on_error( "ERROR: %s already exists and is not a socket"%( self.socket_path ) )
+        probe = socket.socket( socket.AF_UNIX, socket.SOCK_STREAM )
+        try:
+            probe.connect( self.socket_path )
+            exit_on_error( "ERROR: A server is already running on %s"%( self.socket_path ) )
+        except socket.error:
+            # Left behind by a server which is no longer running
+            os.remove( self.socket_path )
+        finally:
+            probe.close()
+
+
+    def __serve_connection( self, connection ):
+        request_data = b''
+        while not request_data.endswith( b'\n' ):
+            data = connection.recv( 65536 )
+            if not data:
+                break
+            request_data += data
+        if not request_data:
+            # A client checking whether the server is running
+            return
+        request = json.loads( request_data.decode( 'utf-8' ) )
+        response, is_interrupted = self.__run_request( request )
+        connection.sendall( ( json.dumps( response ) + '\n' ).encode( 'utf-8' ) )
+        if is_interrupted:
+            raise KeyboardInterrupt()
+
+
+    # Returns a tuple of ( response, True if the server was stopped while
+    # running the request )
+    def __run_request( self, request ):
+        recording = []
+        status = 0
+        is_interrupted = False
+        generated_files = []
+        saved_cwd = os.getcwd()
+        saved_streams = ( sys.stdin, sys.stdout, sys.stderr )
+        sys.stdin = io.StringIO( request.get( 'stdin', '' ) )
+        sys.stdout = MockOutputRecorder( 'stdout', recording )
+        sys.stderr = MockOutputRecorder( 'stderr', recording )
+        try:
+            os.chdir( request['cwd'] )
+            status, generated_files = self.request_handler( request['argv'] )
+        except SystemExit as e:
+            status = e.code if isinstance( e.code, int ) else 1
+        except KeyboardInterrupt:
+            eprint( "ERROR: The server was stopped before the request finished" )
+            status = 1
+            is_interrupted = True
+        except Exception:
+            sys.stderr.write( traceback.format_exc() )
+            status = 1
+        finally:
+            sys.stdin, sys.stdout, sys.stderr = saved_streams
+            os.chdir( saved_cwd )
+        return { 'status': status, 'output': recording, 'generated_files': generated_files }, is_interrupted
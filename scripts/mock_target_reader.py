@@ -0,0 +1,177 @@
+#!/usr/bin/python
+# @file mock_target_reader.py
+# @author matthew.denis.conway@gmail.com
+# @description Read the headers to mock (and where to mock them) from the
+# command line, response files, JSON manifests, directory trees and stdin
+
+
+import json
+import os
+import sys
+from os import path
+
+from parse_command import check_header_to_mock
+from mcmock_utils import *
+
+
+class MockTargetReader:
+
+
+    # API to get the targets to mock, a target is a dictionary of:
+    #   'header' - the header to mock
+    #   'output_directory' - where to put the generated mock files
+    #   'root_include_directory' - where the header to mock lives
+    #   'additional_includes' - list of additional include directories
+    #   'preprocessor' - CompilerPreprocessor to pre-process the header with (or
+    #       None to use mcmock's own pre-processor)
+    #   'generation_date' - the date to stamp into the generated files ('' to
+    #       leave the date out, or None to use today's date)
+    #   'depfile' - whether to write a dependency file for the mock
+    # The targets are generated in groups; each group holds the targets which
+    # are available together (all the headers listed on the command line or in
+    # a manifest, the headers in one directory of a tree, or a single line read
+    # from a file or stdin), so mocking can start before the rest of the
+    # headers have been read.
+    def get_target_groups( self ):
+        for source_type, value in self.command_data.get_header_sources():
+            if source_type == 'headers':
+                yield [ self.__create_target( header ) for header in value ]
+            elif source_type == 'manifest':
+                yield self.__read_manifest( value )
+            elif source_type == 'tree':
+                for targets in self.__read_tree( value ):
+                    yield targets
+            else:
+                for header in self.__read_header_list( value ):
+                    yield [ self.__create_target( header ) ]
+
+
+    def __init__( self, command_data ):
+        self.command_data = command_data
+        self.preprocessor = None
+        if command_data.get_cpp_command() or command_data.get_cpp_output_directory():
+            from compiler_preprocessor import CompilerPreprocessor
+            self.preprocessor = CompilerPreprocessor( command_data.get_cpp_command(), command_data.get_cpp_output_directory() )
+
+
+    def __create_target( self, header ):
+        return {
+            'header': header,
+            'output_directory': self.command_data.get_output_directory(),
+            'root_include_directory': self.command_data.get_root_include_directory(),
+            'additional_includes': self.command_data.get_additional_includes(),
+            'preprocessor': self.preprocessor,
+            'generation_date': self.command_data.get_generation_date(),
+            'depfile': self.command_data.write_depfiles()
+        }
+
+
+    # Reads a file (or stdin, if no path is supplied) listing one header per
+    # line, blank lines and lines starting with # are ignored
+    def __read_header_list( self, header_list_path ):
+        if header_list_path is None:
+            header_list_handle = sys.stdin
+        else:
+            header_list_handle = open( header_list_path, "r" )
+        try:
+            # readline() rather than iterating the file, so each header is
+            # returned as soon as its line has been written to stdin
+            for line in iter( header_list_handle.readline, '' ):
+                header = line.strip()
+                if header and not header.startswith( '#' ):
+                    errors = check_header_to_mock( header )
+                    if errors:
+                        exit_on_error( errors )
+                    yield header
+        finally:
+            if header_list_path is not None:
+                header_list_handle.close()
+
+
+    def __read_manifest( self, manifest_path ):
+        manifest_handle = open( manifest_path, "r" )
+        manifest_data = manifest_handle.read()
+        manifest_handle.close()
+        try:
+            entries = json.loads( manifest_data )['headers']
+        except ( ValueError, KeyError, TypeError ):
+            exit_on_error( "ERROR: Invalid manifest %s, expected { \"headers\": [ ... ] }"%( manifest_path ) )
+        targets = []
+        for entry in entries:
+            if not isinstance( entry, dict ) or 'header' not in entry:
+                exit_on_error( "ERROR: Invalid manifest %s, every entry must have a \"header\""%( manifest_path ) )
+            errors = check_header_to_mock( entry['header'] )
+            if errors:
+                exit_on_error( errors )
+            target = self.__create_target( entry['header'] )
+            if 'output_directory' in entry:
+                target['output_directory'] = self.__check_directory( manifest_path, entry['output_directory'], "Output directory" )
+            if 'root_include_directory' in entry:
+                target['root_include_directory'] = self.__check_directory( manifest_path, entry['root_include_directory'], "The includes root directory" )
+            if 'additional_includes' in entry:
+                target['additional_includes'] = [ self.__check_directory( manifest_path, include_dir, "The additional include directory" ) for include_dir in entry['additional_includes'] ]
+            targets.append( target )
+        return targets
+
+
+    # Walks a directory tree with os.scandir (so each directory is listed once,
+    # and a file's type comes from its directory entry rather than a stat),
+    # generating a list of targets for the headers in each directory. The
+    # headers are named relative to the root include directory if the tree is
+    # inside it, otherwise relative to the tree, which becomes the root include
+    # directory for them (so the mocks mirror the tree's layout under the
+    # output directory).
+    def __read_tree( self, tree_directory ):
+        tree_directory = path.abspath( tree_directory )
+        root_include_directory = self.command_data.get_root_include_directory()
+        if not root_include_directory or path.relpath( tree_directory, root_include_directory ).startswith( '..' ):
+            root_include_directory = tree_directory + '/'
+        header_prefix = path.relpath( tree_directory, root_include_directory )
+        header_prefix = '' if header_prefix == '.' else header_prefix + '/'
+        include_globs = self.command_data.get_tree_include_globs() or [ '*.h' ]
+        exclude_globs = self.command_data.get_tree_exclude_globs()
+        # Directories still to be walked, as paths relative to the tree
+        directories = [ '' ]
+        while directories:
+            directory = directories.pop()
+            headers = []
+            subdirectories = []
+            with os.scandir( path.join( tree_directory, directory ) ) as entries:
+                for entry in entries:
+                    relative_path = directory + entry.name
+                    if self.__match_glob( relative_path, entry.name, exclude_globs ):
+                        continue
+                    # Symbolic links to directories aren't followed, so a link
+                    # back up the tree can't make the walk loop
+                    if entry.is_dir( follow_symlinks=False ):
+                        subdirectories.append( relative_path + '/' )
+                    elif entry.is_file() and self.__match_glob( relative_path, entry.name, include_globs ):
+                        headers.append( relative_path )
+            # Sorted, so the headers are mocked in the same order every run
+            # (depth first, the headers in a directory before its
+            # subdirectories)
+            directories.extend( sorted( subdirectories, reverse=True ) )
+            if headers:
+                targets = []
+                for header in sorted( headers ):
+                    target = self.__create_target( header_prefix + header )
+                    target['root_include_directory'] = root_include_directory
+                    targets.append( target )
+                yield targets
+
+
+    def __match_glob( self, relative_path, name, globs ):
+        # Only imported for --tree, as it isn't needed to start mcmock
+        import fnmatch
+        for glob in globs:
+            if fnmatch.fnmatchcase( relative_path, glob ) or fnmatch.fnmatchcase( name, glob ):
+                return True
+        return False
+
+
+    def __check_directory( self, manifest_path, directory, description ):
+        if ( not path.exists( directory ) or not path.isdir( directory ) ):
+            exit_on_error( "ERROR: %s %s (in manifest %s) does not exist."%( description, directory, manifest_path ) )
+        if not directory.endswith( '/' ):
+            directory += '/'
+        return directory
@@ -19,6 +19,19 @@ mocked_file_banner_template = \
 """
 
 
+# The file banner when the generated files aren't dated (--date none)
+mocked_file_undated_banner_template = \
+"""/**
+ * @file <filename>
+ *
+ * @brief Auto generated mock implementation for the header file:
+ *        <mocked_header_name>
+ *
+ * THIS FILE WAS AUTOGENERATED BY MCMOCK DO NOT EDIT
+ */
+"""
+
+
 # ##############################################################################
 # Mocked header template
 
@@ -8,6 +8,8 @@
 import re
 from mcmock_types import ParameterType, Parameter, Function, TypedefType, Typedef
 from mcmock_utils import *
+from c_tokenizer import tokenize_line
+from c_splitter import find_separators, find_closing_bracket, split_outside_brackets
 
 
 class CHeaderParser:
@@ -61,65 +63,58 @@ class CHeaderParser:
     def __merge_multiline_variable_definitions( self, stripped_data ):
         working_copy = []
         brace_open_count = 0
-        multi_liner = ''
+        multi_liner = []
         for line in stripped_data:
             line = line.strip()
-            if line.startswith( '#' ):
+            source_line = tokenize_line( line )
+            if source_line.directive() is not None:
                 working_copy.append( line )
-            else:
+            elif line:
                 # Variables like enums and structs that can be spread across multiple
                 # lines need to be merged so their definition is only on one line
-                x=0
-                for x in range( 0, len( line ) ):
-                    c = line[x]
-                    if c == '{':
-                        brace_open_count+=1
-                    elif c == '}':
-                        brace_open_count=0
-                    if ( x+1 == len( line ) ):
-                        if ( brace_open_count > 0 ):
-                            multi_liner += line + ' '
-                        else:
-                            if ( multi_liner != '' ):
-                                working_copy.append( multi_liner + ' ' + line )
-                                multi_liner = ''
-                            else:
-                                working_copy.append( line )
-                    x+=1
+                brace_open_count = max( 0, find_separators( line, '', '{}', brace_open_count )[1] )
+                if ( brace_open_count > 0 ):
+                    multi_liner.append( line )
+                else:
+                    if multi_liner:
+                        working_copy.append( ' '.join( multi_liner ) + '  ' + line )
+                        multi_liner = []
+                    else:
+                        working_copy.append( line )
         return working_copy
 
 
     def __concatenate_multi_line_split_lines( self, unparsed_content ):
         working_copy = []
-        i=0
-        concatenated_line = ''
-        if ( len( unparsed_content ) > 0 ):
-            while( i < len( unparsed_content ) ):
-                add_concatenated_line = False
-                if unparsed_content[i].startswith('#'):
-                    concatenated_line = unparsed_content[i]
-                    add_concatenated_line = True
-                else:
-                    concatenated_line += unparsed_content[i] + ' '
-                    re_result = re.search( ';', unparsed_content[i])
-                    if ( re_result ):
+        # The lines of the statement being concatenated
+        concatenated_lines = []
+        for line in unparsed_content:
+            add_concatenated_line = False
+            source_line = tokenize_line( line )
+            if source_line.directive() is not None:
+                # A directive replaces any unfinished statement
+                concatenated_lines = [ line ]
+                add_concatenated_line = True
+            else:
+                concatenated_lines.append( line )
+                for token in source_line.tokens():
+                    if token.text() == ';':
                         add_concatenated_line = True
-                if add_concatenated_line:
-                    working_copy.append( concatenated_line.strip() )
-                    concatenated_line = ''
-                i += 1
+                        break
+            if add_concatenated_line:
+                working_copy.append( ' '.join( concatenated_lines ).strip() )
+                concatenated_lines = []
         return working_copy
 
 
     def __parse_function_definitions( self, stripped_content, pre_parsed_header, pre_parsed_included_headers):
         for function in stripped_content:
-            i = 0
-            function_name_and_retval = ''
-            while i < len( function ):
-                char = function[i]
-                if ( char == '(' ):
-                    break;
-                i += 1
+            # Find the start of the parameter list
+            i = len( function )
+            for token in tokenize_line( function ).tokens():
+                if token.text() == '(':
+                    i = token.start()
+                    break
             if ( i != len( function ) ):
                 function_name_and_retval = self.__find_function_name_and_retval( function[0:i] )
                 self.function_list.append(
@@ -150,84 +145,17 @@ class CHeaderParser:
         return f
 
 
+    # Returns the text between the first '(' and the ')' which closes it (the
+    # rest of the text if it is never closed)
     def __get_parameter_list( self, function_parameters ):
-        stripped_function_parameters = ''
-        i = 0
-        open_braces = 0;
         function_parameters = function_parameters.strip()
-        while i < len( function_parameters ):
-            if ( function_parameters[i] == '(' ):
-                open_braces += 1
-                # Don't include the first open brace; skip straight to next char
-                if ( open_braces == 1 ):
-                    i+=1
-            if ( function_parameters[i] == ')'):
-                open_braces -= 1
-                # Don't include the final close brace
-                if ( open_braces == 0 ):
-                    break
-            if ( open_braces > 0 ):
-                stripped_function_parameters += function_parameters[i]
-            i+=1
-        return stripped_function_parameters
-
-
-    def __get_next_parameter_from_parameter_string( self, parameter_string ):
-        brace_open_count = 0
-        i=0
-        while i < len( parameter_string ):
-            if parameter_string[i] == '(':
-                brace_open_count += 1
-            elif parameter_string[i] == ')':
-                brace_open_count -= 1
-            if brace_open_count == 0 and parameter_string[i] == ',':
-                return \
-                {
-                    'parameter':parameter_string[0:i].strip(),
-                    'remainder':parameter_string[i+1:].strip()
-                }
-                break
-            else:
-                i+=1
-        # parameter_string only contains one parameter:
-        return \
-        {
-            'parameter':parameter_string,
-            'remainder':''
-        }
-
-
-    def __extract_function_pointer_parameter( self, parameter_list ):
-        f_ptr_str = ''
-        # Run a regex on the function parameter to extract three groups:
-        # 1. The return type of the function
-        # 2. The function pointer name
-        # 3. The rest of the parameter list including parameters of the function
-        #    pointer
-        f_ptr_matched = re.match( r'^([^,*]+)(\(\ *\*\ *[A-Za-z0-9_]+\ *\))(.*)', parameter_list['parameter'] + parameter_list['remainder'] )
-        if f_ptr_matched:
-            f_ptr_str = f_ptr_matched.group(1).strip() + f_ptr_matched.group(2).strip()
-        else:
-            exit_on_error( "Failed to parse the function pointer parameter [", parameter_list, "]" )
-
-        brace_open_count = 0
-        i=0
-        while i < len( f_ptr_matched.group(3) ):
-            if f_ptr_matched.group(3)[i] == '(':
-                brace_open_count += 1
-            elif f_ptr_matched.group(3)[i] == ')':
-                brace_open_count -= 1
-            # Got to the end of the function pointer definition, so
-            # extract the function pointer parameters and check if there
-            # are any more parameters to be parsed (parameter_string).
-            if brace_open_count == 0:
-                f_ptr_str += f_ptr_matched.group(3)[0:i+1]
-                break
-            i+=1
-        return {
-            'f_ptr_str':f_ptr_str,
-            'remainder':f_ptr_matched.group(3)[i+1:].strip()[1:]
-        }
+        open_brace = function_parameters.find( '(' )
+        if open_brace < 0:
+            return ''
+        close_brace = find_closing_bracket( function_parameters, open_brace )
+        if close_brace < 0:
+            return function_parameters[open_brace + 1:]
+        return function_parameters[open_brace + 1:close_brace]
 
 
     # Returns a dictionary containing the function pointer data:
@@ -250,19 +178,12 @@ class CHeaderParser:
             else:
                 exit_on_error( "ERROR: Failed to parse the function pointer string [",f_ptr_str,"]" )
             # Extract the parameters of the function pointer:
+            # NOTE: This code assumes that the first char will be a '('
             function_pointer['parameters'] = ''
-            brace_open_count = 0
-            i=0
-            while i < len( matched.group(3).strip() ):
-                # NOTE: This code assumes that the first char will be a '('
-                if matched.group(3)[i] == '(':
-                    brace_open_count += 1
-                elif matched.group(3)[i] == ')':
-                    brace_open_count -= 1
-                if brace_open_count == 0:
-                    function_pointer['parameters'] = matched.group(3)[1:i].strip()
-                    break
-                i+=1
+            if matched.group(3).startswith( '(' ):
+                close_brace = find_closing_bracket( matched.group(3), 0 )
+                if close_brace > 0:
+                    function_pointer['parameters'] = matched.group(3)[1:close_brace].strip()
         else:
             function_pointer = None
         return function_pointer
@@ -366,17 +287,20 @@ class CHeaderParser:
     def __parse_function_parameter_list( self, function_name, function_parameters, pre_parsed_header, pre_parsed_included_headers ):
         parameter_list = []
         if function_parameters.strip():
-            parameter_string = function_parameters
-            while parameter_string:
-                result = self.__get_next_parameter_from_parameter_string( parameter_string )
-                parameter_string = result['remainder']
-                if result['parameter']:
-                    if result['parameter'].strip() != "void":
-                        p_instance = self.__parse_parameter( result['parameter'], pre_parsed_header, pre_parsed_included_headers )
+            parameters = split_outside_brackets( function_parameters )
+            if len( parameters ) > 1:
+                parameters = [ parameter.strip() for parameter in parameters ]
+                # A trailing comma is ignored
+                if not parameters[-1]:
+                    parameters.pop()
+            for parameter in parameters:
+                if parameter:
+                    if parameter.strip() != "void":
+                        p_instance = self.__parse_parameter( parameter, pre_parsed_header, pre_parsed_included_headers )
                         if p_instance:
                             parameter_list.append( p_instance )
                         else:
-                            exit_on_error( "ERROR parsing parameter[", result['parameter'], "] for function[", function_name ,"]"  )
+                            exit_on_error( "ERROR parsing parameter[", parameter, "] for function[", function_name ,"]"  )
                 else:
                     exit_on_error( "ERROR parsing function definition: ", function_name, "(", function_parameters, ");" )
         return parameter_list
@@ -6,28 +6,104 @@
 
 import sys
 import re
-from os import path, getcwd
+from os import path, getcwd, environ
+
+from mcmock_utils import mcmock_utils_get_generation_date
+
+
+mcmock_version = "1.0"
 
 
 help_string = \
-"""mcmock Version 1.0
+"""mcmock Version %s
 Tool for auto-generating mock files for C headers
 
 EXAMPLES:
     generate_mock.py header_to_mock.h
     generate_mock.py -o /tmp/mocks/ -r /usr/include -m header_one.h header_two.h
     generate_mock.py -o /tmp/mocks/ -r /usr/include -i /usr/custom_include -m header_one.h header_two.h
+    generate_mock.py -o /tmp/mocks/ -r /usr/include -m @headers.txt
+    list_headers.sh | generate_mock.py -o /tmp/mocks/ -r /usr/include --stdin
+    generate_mock.py -o /tmp/mocks/ --tree /usr/include/mylib --tree-exclude "internal/*"
 
 OPTIONS:
     -h  display mcmock help
     -o  path where to put generated mock files (if not supplied, cwd will be used)
     -r  path to the root directory where include files live
     -i  (space separated) list of additional include directories
-    -m  (space separated) list of header files to mock
-"""
+    -m  (space separated) list of header files to mock, @file reads the headers
+        to mock from file (one header per line)
+    --manifest  JSON file listing the headers to mock, each header can have its
+        own output directory and include directories (see below)
+    --stdin  read the headers to mock from stdin (one header per line)
+    --tree  directory to mock every header under (including subdirectories),
+        the mocks mirror its layout under -o. The headers are named relative
+        to -r (if the directory is inside -r) or to the directory itself,
+        which is then the root include directory for them
+    --tree-include  glob matching the files under --tree to mock (default *.h),
+        may be given more than once; matched against the path relative to the
+        tree and the file name, i.e. "*.h" or "drivers/*.h"
+    --tree-exclude  glob matching the files or directories under --tree not to
+        mock, may be given more than once (an excluded directory isn't searched)
+    --jobs  number of headers to mock in parallel, or "auto" to use one job per CPU.
+        If a header fails to mock, the mocks of later headers which were
+        already being generated are still written
+    --watch  keep running, and regenerate the mocks whenever the headers to mock
+        (or the headers they include) change. Headers are mocked one at a time
+        in a single process, so the pre-parsed included headers are reused
+        (so it can't be used with --jobs)
+    --serve  path of a Unix socket to serve mock requests on, send requests
+        with mcmock_client.py (which takes the same options as mcmock.py).
+        The server keeps the pre-parsed included headers between requests,
+        and serves requests one at a time, in the order they arrive
+    --profile  JSON file to write the wall time, CPU time and peak memory of each
+        stage of mocking each header to (times include the cost of tracing
+        memory allocations), and how many included headers were pre-parsed or
+        reused from the pre-parse cache
+    --cprofile  directory to write cProfile statistics for each mocked header
+        to, as <header>.prof (with any / in the header replaced by _)
+    --cpp  pre-process the headers to mock with the C compiler instead of
+        mcmock's own pre-processor, i.e. --cpp "cc -E -DSOME_OPTION=1" (the
+        include directories are passed with -I). Only the declarations made
+        by the header to mock itself are mocked (found from the linemarkers).
+        Each header is pre-processed to decide whether its mock is up to date,
+        so a change to any file the pre-processor reads regenerates the mock
+    --cpp-output  as --cpp, but read the pre-processed output the compiler has
+        already written, a header dir/header.h is read from <directory>/dir/header.i
+    --date  date to stamp into the generated files instead of today's, or
+        "none" to leave the date out (so regenerating a mock that hasn't
+        changed gives the same file). If not supplied, the date is taken from
+        the SOURCE_DATE_EPOCH environment variable, when it is set
+    --depfile  also write a Makefile syntax dependency file for each mock (as
+        cc -MD -MP does), mock_<name>.mcmock.d beside the mock files, listing
+        the files the mock was generated from, for make or ninja (depfile =).
+        A mock which comes out the same isn't rewritten, so with ninja also
+        set restat = 1
+
+Headers read from a file or stdin are mocked as soon as they are read. The
+--manifest file has the format:
+    { "headers": [ { "header": "header_one.h",
+                     "output_directory": "/tmp/mocks/",
+                     "root_include_directory": "/usr/include",
+                     "additional_includes": [ "/usr/custom_include" ] } ] }
+where only "header" is required, the other values default to -o, -r and -i
+
+Headers whose content (and included headers) haven't changed since their mock
+was generated are skipped, see the .mcmock_manifest.json in the output directory.
+Generated files are only rewritten when their content changes, so a mock which
+comes out the same keeps its modification time.
+"""%( mcmock_version )
+
+
+arg_options = [ '-o', '-m', '-r', '-i', '--jobs', '--manifest', '--stdin', '--tree', '--tree-include', '--tree-exclude', '--watch', '--serve', '--profile', '--cprofile', '--cpp', '--cpp-output', '--date', '--depfile' ]
 
 
-arg_options = [ '-o', '-m', '-r', '-i' ]
+# Function to check the name of a header file to mock, returns an error message
+# (or '' if the name is valid)
+def check_header_to_mock( header ):
+    if re.match( r'([\/A-Za-z0-9_-]+)(.h)', header ):
+        return ''
+    return "ERROR: Expected C header file, but got [%s]\nTry -h for usage"%( header )
 
 
 class ParseCommand:
@@ -48,6 +124,22 @@ class ParseCommand:
     def get_headers_to_mock( self ):
         return self.command_data['headers_to_mock']
 
+    # Each header source is a tuple of ( source type, value ), in command line
+    # order, where the source type is one of:
+    #   'headers' - value is a list of headers from the command line
+    #   'response_file' - value is the path of a file listing headers
+    #   'manifest' - value is the path of a JSON manifest listing headers
+    #   'stdin' - value is None, headers are listed on stdin
+    #   'tree' - value is the path of a directory to mock every header under
+    def get_header_sources( self ):
+        return self.command_data['header_sources']
+
+    def get_tree_include_globs( self ):
+        return self.command_data['tree_include_globs']
+
+    def get_tree_exclude_globs( self ):
+        return self.command_data['tree_exclude_globs']
+
     def get_root_include_directory( self ):
         return self.command_data['root_include_directory']
 
@@ -57,15 +149,56 @@ class ParseCommand:
     def get_additional_includes( self ):
         return self.command_data['additional_includes']
 
+    def get_jobs( self ):
+        return self.command_data['jobs']
+
+    def watch_for_changes( self ):
+        return self.command_data['watch']
+
+    def get_server_socket( self ):
+        return self.command_data['server_socket']
+
+    def get_profile_file( self ):
+        return self.command_data['profile_file']
+
+    def get_cprofile_directory( self ):
+        return self.command_data['cprofile_directory']
+
+    def get_cpp_command( self ):
+        return self.command_data['cpp_command']
+
+    def get_cpp_output_directory( self ):
+        return self.command_data['cpp_output_directory']
+
+    # The date to stamp into the generated files, '' to leave the date out, or
+    # None to use today's date
+    def get_generation_date( self ):
+        return self.command_data['generation_date']
+
+    def write_depfiles( self ):
+        return self.command_data['depfile']
+
 
     def __init__( self, command_args ):
         self.command_data = {}
         self.command_data['headers_to_mock'] = []
+        self.command_data['header_sources'] = []
         self.command_data['additional_includes'] = []
         self.command_data['root_include_directory'] = ''
         self.command_data['output_directory'] = getcwd()
         self.command_data['errors'] = ''
         self.command_data['show_help'] = False
+        self.command_data['jobs'] = 1
+        self.command_data['watch'] = False
+        self.command_data['server_socket'] = ''
+        self.command_data['profile_file'] = ''
+        self.command_data['cprofile_directory'] = ''
+        self.command_data['cpp_command'] = ''
+        self.command_data['cpp_output_directory'] = ''
+        self.command_data['tree_include_globs'] = []
+        self.command_data['tree_exclude_globs'] = []
+        self.command_data['generation_date'] = None
+        self.command_data['depfile'] = False
         if self.__check_command_length( command_args ):
             self.command_data['errors'] = self.__parse_command( command_args )
 
@@ -106,11 +239,15 @@ class ParseCommand:
                         arg = command_args[j]
                         if arg in arg_options:
                             break;
-                        matched = re.match( r'([\/A-Za-z0-9_-]+)(.h)', arg )
-                        if matched:
-                            self.command_data['headers_to_mock'].append( arg )
+                        if arg.startswith( '@' ):
+                            if ( not path.isfile( arg[1:] ) ):
+                                errors = "ERROR: The file of headers to mock %s does not exist."%( arg[1:] )
+                            self.command_data['header_sources'].append( ( 'response_file', arg[1:] ) )
                         else:
-                            errors = "ERROR: Expected C header file, but got [%s]\nTry -h for usage"%( arg )
+                            errors = check_header_to_mock( arg )
+                            if not errors:
+                                self.command_data['headers_to_mock'].append( arg )
+                                self.__add_header_from_command_line( arg )
                         j+=1
                     i=j
                 else:
@@ -144,9 +281,124 @@ class ParseCommand:
                     i=j
                 else:
                     errors = "ERROR: found -i option with no additional includes specified\nTry -h for usage"
+            elif ( arg == '--jobs' ):
+                if ( len( command_args ) > i + 1 ):
+                    jobs = command_args[i+1]
+                    if ( jobs == 'auto' ):
+                        from multiprocessing import cpu_count
+                        self.command_data['jobs'] = cpu_count()
+                    elif ( jobs.isdigit() and int( jobs ) > 0 ):
+                        self.command_data['jobs'] = int( jobs )
+                    else:
+                        errors = "ERROR: Expected a number of jobs or auto for --jobs, but got [%s]\nTry -h for usage"%( jobs )
+                else:
+                    errors = "ERROR: found --jobs option with no number of jobs specified\nTry -h for usage"
+                i+=2
+            elif ( arg == '--manifest' ):
+                if ( len( command_args ) > i + 1 ):
+                    manifest = command_args[i+1]
+                    if ( not path.isfile( manifest ) ):
+                        errors = "ERROR: The manifest %s does not exist."%( manifest )
+                    self.command_data['header_sources'].append( ( 'manifest', manifest ) )
+                else:
+                    errors = "ERROR: found --manifest option with no manifest specified\nTry -h for usage"
+                i+=2
+            elif ( arg == '--watch' ):
+                self.command_data['watch'] = True
+                i+=1
+            elif ( arg == '--serve' ):
+                if ( len( command_args ) > i + 1 ):
+                    self.command_data['server_socket'] = command_args[i+1]
+                else:
+                    errors = "ERROR: found --serve option with no socket specified\nTry -h for usage"
+                i+=2
+            elif ( arg == '--profile' ):
+                if ( len( command_args ) > i + 1 ):
+                    self.command_data['profile_file'] = command_args[i+1]
+                else:
+                    errors = "ERROR: found --profile option with no profile file specified\nTry -h for usage"
+                i+=2
+            elif ( arg == '--cprofile' ):
+                if ( len( command_args ) > i + 1 ):
+                    cprofile_directory = command_args[i+1]
+                    if ( not path.exists( cprofile_directory ) or not path.isdir( cprofile_directory ) ):
+                        errors = "ERROR: The cProfile directory %s does not exist."%( cprofile_directory )
+                    self.command_data['cprofile_directory'] = cprofile_directory
+                else:
+                    errors = "ERROR: found --cprofile option with no directory specified\nTry -h for usage"
+                i+=2
+            elif ( arg == '--cpp' ):
+                if ( len( command_args ) > i + 1 ):
+                    self.command_data['cpp_command'] = command_args[i+1]
+                else:
+                    errors = "ERROR: found --cpp option with no pre-processor command specified\nTry -h for usage"
+                i+=2
+            elif ( arg == '--cpp-output' ):
+                if ( len( command_args ) > i + 1 ):
+                    cpp_output_directory = command_args[i+1]
+                    if ( not path.exists( cpp_output_directory ) or not path.isdir( cpp_output_directory ) ):
+                        errors = "ERROR: The pre-processed output directory %s does not exist."%( cpp_output_directory )
+                    self.command_data['cpp_output_directory'] = cpp_output_directory
+                else:
+                    errors = "ERROR: found --cpp-output option with no directory specified\nTry -h for usage"
+                i+=2
+            elif ( arg == '--tree' ):
+                if ( len( command_args ) > i + 1 ):
+                    tree_directory = command_args[i+1]
+                    if ( not path.exists( tree_directory ) or not path.isdir( tree_directory ) ):
+                        errors = "ERROR: The tree directory %s does not exist."%( tree_directory )
+                    self.command_data['header_sources'].append( ( 'tree', tree_directory ) )
+                else:
+                    errors = "ERROR: found --tree option with no directory specified\nTry -h for usage"
+                i+=2
+            elif ( arg == '--tree-include' ):
+                if ( len( command_args ) > i + 1 ):
+                    self.command_data['tree_include_globs'].append( command_args[i+1] )
+                else:
+                    errors = "ERROR: found --tree-include option with no glob specified\nTry -h for usage"
+                i+=2
+            elif ( arg == '--tree-exclude' ):
+                if ( len( command_args ) > i + 1 ):
+                    self.command_data['tree_exclude_globs'].append( command_args[i+1] )
+                else:
+                    errors = "ERROR: found --tree-exclude option with no glob specified\nTry -h for usage"
+                i+=2
+            elif ( arg == '--date' ):
+                if ( len( command_args ) > i + 1 ):
+                    generation_date = command_args[i+1]
+                    if ( generation_date == 'none' ):
+                        generation_date = ''
+                    self.command_data['generation_date'] = generation_date
+                else:
+                    errors = "ERROR: found --date option with no date specified\nTry -h for usage"
+                i+=2
+            elif ( arg == '--depfile' ):
+                self.command_data['depfile'] = True
+                i+=1
+            elif ( arg == '--stdin' ):
+                self.command_data['header_sources'].append( ( 'stdin', None ) )
+                i+=1
             else:
                 errors = "ERROR: Unknown arg %s\nTry -h for usage"%(arg)
-        if not errors and not self.command_data['headers_to_mock']:
+        if not errors and self.command_data['generation_date'] is None and environ.get( 'SOURCE_DATE_EPOCH' ):
+            source_date_epoch = environ['SOURCE_DATE_EPOCH']
+            if source_date_epoch.isdigit():
+                self.command_data['generation_date'] = mcmock_utils_get_generation_date( int( source_date_epoch ) )
+            else:
+                errors = "ERROR: Expected a number of seconds for SOURCE_DATE_EPOCH, but got [%s]"%( source_date_epoch )
+        if not errors and self.command_data['watch'] and self.command_data['jobs'] > 1:
+            errors = "ERROR: --watch mocks the headers one at a time, so can't be used with --jobs\nTry -h for usage"
+        if not errors and self.command_data['cpp_command'] and self.command_data['cpp_output_directory']:
+            errors = "ERROR: --cpp and --cpp-output can't be used together\nTry -h for usage"
+        if not errors and not self.command_data['header_sources'] and not self.command_data['server_socket']:
             errors = "ERROR: No header(s) to be mocked were specified\nTry -h for usage"
         return errors
 
+
+
+    def __add_header_from_command_line( self, header ):
+        # Consecutive headers on the command line form a single source
+        sources = self.command_data['header_sources']
+        if not sources or sources[-1][0] != 'headers':
+            sources.append( ( 'headers', [] ) )
+        sources[-1][1].append( header )
@@ -6,8 +6,10 @@
 
 
 import re
-from mcmock_types import ParameterType, Parameter, Function, TypedefType, Typedef, DefinedSymbol
+from mcmock_types import ParameterType, Parameter, Function, TypedefType, Typedef, DefinedSymbol, TokenType
 from mcmock_utils import *
+from c_tokenizer import tokenize_line, get_included_header
+from c_splitter import find_separators
 
 
 class PreParseCHeader:
@@ -27,12 +29,11 @@ class PreParseCHeader:
 
 
     def lookup_defined_symbol( self, lookup ):
-        result = None
-        for sym in self.defined_symbols:
-            if ( sym.name() == lookup ):
-                result = sym
-                break
-        return result
+        if self.defined_symbols_by_name is None:
+            self.defined_symbols_by_name = {}
+            for sym in self.defined_symbols:
+                self.defined_symbols_by_name.setdefault( sym.name(), sym )
+        return self.defined_symbols_by_name.get( lookup )
 
 
     # API to get a list of all typedefs defined within the header file, this
@@ -58,6 +59,7 @@ class PreParseCHeader:
         self.included_application_headers = []
         self.included_system_headers = []
         self.defined_symbols = []
+        self.defined_symbols_by_name = None
         self.typedefs = []
         working_copy = list( file_data )
         working_copy = list( self.__parse_defined_symbols( working_copy ) )
@@ -71,24 +73,42 @@ class PreParseCHeader:
         expanded = []
         for line in unparsed_data:
             line = line.strip()
-            open_brace_count = 0
-            line_to_add = ''
-            x=0
-            for x in range( 0, len( line ) ):
-                c = line[x]
-                line_to_add += c
-                if c == '{':
-                    open_brace_count += 1
-                elif c == '}':
-                    open_brace_count -= 1
-                if ( open_brace_count <= 0 ) and ( c == ';') and ( len( line ) > ( x + 1 ) ):
-                    expanded.append( line_to_add.strip() )
-                    line_to_add = ''
-                x+=1
-            expanded.append( line_to_add.strip() )
+            statement_start = 0
+            for index in find_separators( line, ';', '{}' )[0]:
+                if len( line ) > index + 1:
+                    expanded.append( line[statement_start:index + 1].strip() )
+                    statement_start = index + 1
+            expanded.append( line[statement_start:].strip() )
         return expanded
 
 
+    # Returns the DefinedSymbol for a #define line, or None if the line doesn't
+    # define a symbol
+    def __get_defined_symbol( self, line ):
+        source_line = tokenize_line( line )
+        tokens = source_line.tokens()
+        if source_line.directive() == 'define' and len( tokens ) > 2 and tokens[2].type() == TokenType.TOKEN_IDENTIFIER:
+            value = line[tokens[2].end():].strip()
+            # A function-like macro has a '(' straight after its name
+            if len( tokens ) > 3 and tokens[3].text() == '(' and tokens[3].start() == tokens[2].end():
+                parameters = []
+                parameter = ''
+                i = 4
+                while i < len( tokens ) and tokens[i].text() != ')':
+                    if tokens[i].text() == ',':
+                        parameters.append( parameter )
+                        parameter = ''
+                    else:
+                        parameter += tokens[i].text()
+                    i += 1
+                if parameter:
+                    parameters.append( parameter )
+                if i < len( tokens ):
+                    return DefinedSymbol( tokens[2].text(), value, parameters, line[tokens[i].end():].strip() )
+            return DefinedSymbol( tokens[2].text(), value )
+        return None
+
+
     def __parse_defined_symbols( self, stripped_content ):
         working_copy = []
         multiline_string = ''
@@ -102,19 +122,19 @@ class PreParseCHeader:
                     # Add a whitespace char at the end of the line to ensure correct
                     # concatenation of defines spread over multiple lines
                     multiline_string += line + ' '
-                    matched = re.match( r'#define +([A-Za-z0-9_]+)(.*)', multiline_string)
-                    if matched:
-                        self.defined_symbols.append( DefinedSymbol( matched.group(1), matched.group(2).strip() ) )
+                    defined_symbol = self.__get_defined_symbol( multiline_string )
+                    if defined_symbol:
+                        self.defined_symbols.append( defined_symbol )
                     else:
                         eprint( "WARNING: Failed to parse the multi-line #define: ", multiline_string )
                     parsed_multiline = True
             else:
-                matched = re.match( r'#define +([A-Za-z0-9_]+)(.*)', line)
-                if matched:
-                    if matched.group(2).strip().endswith('\\'):
+                defined_symbol = self.__get_defined_symbol( line )
+                if defined_symbol:
+                    if defined_symbol.value().endswith('\\'):
                         multiline_string = line[0:-1]
                     else:
-                        self.defined_symbols.append( DefinedSymbol( matched.group(1), matched.group(2).strip() ) )
+                        self.defined_symbols.append( defined_symbol )
             if multiline_string == '':
                 working_copy.append( line )
             elif parsed_multiline:
@@ -127,15 +147,13 @@ class PreParseCHeader:
     def __parse_included_headers( self, stripped_content ):
         working_copy = []
         for line in stripped_content:
-            matched = re.match( r'#include +"([\/\.A-Za-z0-9_-]+)*"', line)
-            if ( matched ):
-                self.included_application_headers.append( matched.group(1) )
+            included_header = get_included_header( tokenize_line( line ) )
+            if included_header is None:
+                working_copy.append( line )
+            elif included_header[1]:
+                self.included_application_headers.append( included_header[0] )
             else:
-                matched = re.match( r'#include +<([\/\.A-Za-z0-9_-]+)*>', line)
-                if matched:
-                    self.included_system_headers.append( matched.group(1) )
-                else:
-                    working_copy.append( line )
+                self.included_system_headers.append( included_header[0] )
         return working_copy
 
 
@@ -193,45 +211,28 @@ class PreParseCHeader:
 
     def __parse_typedefs( self, stripped_content ):
         working_copy = []
-        add_active_typedef = False
-        active_typedef = ''
+        # The lines of the typedef being parsed, which may be spread over
+        # multiple lines
+        active_typedef = []
+        open_brace_count = 0
         for line in stripped_content:
             line = line.strip()
-            if ( active_typedef == '' ):
-                matched = re.match( r'typedef', line )
-                if ( matched ):
-                    # Using the guilty until proven innocent rule ;)
-                    multi_line_typedef = True
-                    open_brace_count = 0
-                    i=0
-                    for c in line:
-                        active_typedef += c;
-                        if c == '{':
-                            open_brace_count += 1
-                        elif c == '}':
-                            open_brace_count -= 1
-                        if ( open_brace_count == 0 ) and ( c == ';'):
-                            add_active_typedef = True
-                        i+=1
-            else:
-                for c in line:
-                    active_typedef += c;
-                    if c == '{':
-                        open_brace_count += 1
-                    elif c == '}':
-                        open_brace_count -= 1
-                    if ( open_brace_count == 0 ) and ( c == ';'):
-                        add_active_typedef = True
-            if ( active_typedef == '' ):
-                working_copy.append( line )
-            elif add_active_typedef:
-                typedef = self.__parse_active_typedef( active_typedef )
+            if not active_typedef:
+                tokens = tokenize_line( line ).tokens()
+                if not ( tokens and tokens[0].text() == 'typedef' ):
+                    working_copy.append( line )
+                    continue
+                open_brace_count = 0
+            active_typedef.append( line )
+            statement_ends, open_brace_count = find_separators( line, ';', '{}', open_brace_count )
+            if statement_ends:
+                typedef_string = ''.join( active_typedef )
+                typedef = self.__parse_active_typedef( typedef_string )
                 if typedef:
                     self.typedefs.append( typedef )
                 else:
-                    exit_on_error( "Failed to parse typedef definition[", active_typedef, "]" )
-                add_active_typedef = False
-                active_typedef = ''
+                    exit_on_error( "Failed to parse typedef definition[", typedef_string, "]" )
+                active_typedef = []
         return working_copy
 
 
@@ -0,0 +1,75 @@
+#!/usr/bin/python
+# @file pre_parse_cache.py
+# @author matthew.denis.conway@gmail.com
+# @description Run scoped cache of pre-parsed included headers, so a header
+# included by many of the headers being mocked is only pre-parsed once
+
+
+import os
+from collections import OrderedDict
+
+from mcmock_utils import *
+
+
+# Default memory bound for the cache, measured as the number of characters of
+# (comment stripped) header content held by the cached pre-parsed headers
+default_max_cache_size = 64 * 1024 * 1024
+
+
+class PreParseCache:
+
+
+    # API to get the pre-parsed instance of a header file; the header is only
+    # read and pre-parsed if it isn't already cached (or has been modified
+    # since it was cached)
+    def get_pre_parsed_header( self, path_to_header ):
+        key = ( os.path.realpath( path_to_header ), os.stat( path_to_header ).st_mtime )
+        entry = self.entries.get( key )
+        if entry:
+            self.hits += 1
+            self.entries.move_to_end( key )
+            return entry['pre_parsed_header']
+        self.misses += 1
+        # Only imported once a header actually has to be pre-parsed
+        from pre_parse_c_header import PreParseCHeader
+        header_handle = open( path_to_header, "r" )
+        header_file_data = mcmock_utils_remove_comments( header_handle.readlines() )
+        header_file_data = mcmock_utils_remove_whitespace_lines( header_file_data )
+        header_handle.close()
+        pre_parsed_header = PreParseCHeader( path_to_header, header_file_data )
+        size = sum( len( line ) for line in header_file_data )
+        self.entries[key] = { 'pre_parsed_header': pre_parsed_header, 'size': size }
+        self.size += size
+        self.__evict_least_recently_used()
+        return pre_parsed_header
+
+
+    # API to get the number of lookups answered from the cache
+    def get_hits( self ):
+        return self.hits
+
+
+    # API to get the number of lookups which had to pre-parse the header
+    def get_misses( self ):
+        return self.misses
+
+
+    # API to get the (approximate) size of the cached data
+    def get_size( self ):
+        return self.size
+
+
+    def __init__( self, max_size=default_max_cache_size ):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+
+    def __evict_least_recently_used( self ):
+        # Always keep the most recently used entry, even if it's bigger than
+        # the whole cache, as the caller is about to use it
+        while ( self.size > self.max_size and len( self.entries ) > 1 ):
+            key, entry = self.entries.popitem( last=False )
+            self.size -= entry['size']
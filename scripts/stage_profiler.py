@@ -0,0 +1,116 @@
+#!/usr/bin/python
+# @file stage_profiler.py
+# @author matthew.denis.conway@gmail.com
+# @description Record the wall time, CPU time and peak memory (traced with
+# tracemalloc) of each stage of generating the mock for a header, and
+# optionally profile the whole of it with cProfile
+
+
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+
+class StageProfiler:
+
+
+    # API to start profiling the header
+    def start( self ):
+        if not self.enabled:
+            return
+        self.started_tracing = not tracemalloc.is_tracing()
+        if self.started_tracing:
+            tracemalloc.start()
+        if self.cprofile_path:
+            import cProfile
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+        self.start_wall_time = time.perf_counter()
+        self.start_cpu_time = time.process_time()
+
+
+    # API to stop profiling the header, the cProfile statistics (if requested)
+    # are written to their file
+    def stop( self ):
+        if not self.enabled:
+            return
+        self.wall_time = time.perf_counter() - self.start_wall_time
+        self.cpu_time = time.process_time() - self.start_cpu_time
+        if self.cprofile is not None:
+            self.cprofile.disable()
+            self.cprofile.dump_stats( self.cprofile_path )
+            self.cprofile = None
+        if self.started_tracing:
+            tracemalloc.stop()
+
+
+    # API to profile a stage, use as: with profiler.stage( 'parse' ):
+    # A stage which runs more than once is recorded as the total of its runs
+    @contextmanager
+    def stage( self, name ):
+        if not self.enabled:
+            yield
+            return
+        tracemalloc.reset_peak()
+        start_memory = tracemalloc.get_traced_memory()[0]
+        start_wall_time = time.perf_counter()
+        start_cpu_time = time.process_time()
+        try:
+            yield
+        finally:
+            wall_time = time.perf_counter() - start_wall_time
+            cpu_time = time.process_time() - start_cpu_time
+            memory_peak = tracemalloc.get_traced_memory()[1] - start_memory
+            if name not in self.stages:
+                self.stage_names.append( name )
+                self.stages[name] = { 'stage': name, 'wall_time': 0.0, 'cpu_time': 0.0, 'memory_peak': 0 }
+            stage = self.stages[name]
+            stage['wall_time'] += wall_time
+            stage['cpu_time'] += cpu_time
+            stage['memory_peak'] = max( stage['memory_peak'], memory_peak )
+
+
+    # API to count an event while mocking the header (i.e. a pre-parse cache
+    # hit), the counts are part of the profile
+    def count( self, name ):
+        if self.enabled:
+            self.counts[name] = self.counts.get( name, 0 ) + 1
+
+
+    # API to check whether the stages are being profiled
+    def is_enabled( self ):
+        return self.enabled
+
+
+    # API to get the profile of the header, as a dictionary (which can be
+    # serialised as JSON). Times are in seconds, the memory peak of a stage is
+    # the most memory (in bytes) allocated above what was allocated when the
+    # stage started.
+    def get_profile( self ):
+        profile = {
+            'header': self.header,
+            'wall_time': self.wall_time,
+            'cpu_time': self.cpu_time,
+            'memory_peak': max( [ 0 ] + [ stage['memory_peak'] for stage in self.stages.values() ] ),
+            'stages': [ self.stages[name] for name in self.stage_names ],
+            'counts': self.counts
+        }
+        if self.cprofile_path:
+            profile['cprofile'] = self.cprofile_path
+        return profile
+
+
+    # header = the header being mocked
+    # enabled = False for a profiler which records nothing
+    # cprofile_path = path to write cProfile statistics to ('' for none)
+    def __init__( self, header, enabled=True, cprofile_path='' ):
+        self.header = header
+        self.enabled = enabled
+        self.cprofile_path = cprofile_path
+        self.cprofile = None
+        self.started_tracing = False
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.counts = {}
+        self.stage_names = []
+        self.stages = {}
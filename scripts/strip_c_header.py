@@ -6,14 +6,61 @@
 # Copyright (C) Espial Limited 2017 Company Confidential - All Rights Reserved
 
 
-import re
+from bisect import bisect_left
 from mcmock_utils import *
+from mcmock_types import TokenType
+from c_tokenizer import tokenize_line
+from symbol_table import SymbolTable
+from macro_expander import MacroExpander
+from conditional_expression import compile_conditional_expression
+
+
+# Context used to evaluate the conditional expression protecting a block of
+# the header
+class ConditionalBlockContext:
+
+    def is_defined( self, name ):
+        if not self.symbol_table.is_defined( name ):
+            return False
+        # A symbol that is only defined inside the block it protects (i.e. an
+        # include guard) was not defined when the conditional was evaluated
+        defined_lines = self.defined_symbol_lines.get( name, [] )
+        defined_inside_block = bisect_left( defined_lines, self.end_block ) - bisect_left( defined_lines, self.start_block )
+        return defined_inside_block == 0 or len( self.symbol_table.get_definitions( name ) ) > defined_inside_block
+
+    # Symbols that aren't defined, or have no value, evaluate to 0
+    def get_value( self, name ):
+        symbol = self.symbol_table.lookup_defined_symbol( name )
+        if not symbol or symbol.parameters() is not None or not symbol.replacement() or name in self.evaluating:
+            return 0
+        self.evaluating.add( name )
+        try:
+            return compile_conditional_expression( symbol.replacement() ).evaluate( self )
+        except ValueError:
+            return 0
+        finally:
+            self.evaluating.discard( name )
+
+    def call( self, name, arguments ):
+        invocation = '%s(%s)'%( name, arguments )
+        expanded = self.macro_expander.expand_line( invocation )
+        if expanded is None or expanded == invocation:
+            return 0
+        return compile_conditional_expression( expanded ).evaluate( self )
+
+    def __init__( self, symbol_table, macro_expander, defined_symbol_lines, start_block, end_block ):
+        self.symbol_table = symbol_table
+        self.macro_expander = macro_expander
+        self.defined_symbol_lines = defined_symbol_lines
+        self.start_block = start_block
+        self.end_block = end_block
+        self.evaluating = set()
 
 
 class StripCHeader:
 
 
-    _protected_block_starters = ['#if ','#ifdef','#ifndef', '#elif']
+    _sub_block_starters = ['if', 'ifdef', 'ifndef']
 
 
 
@@ -25,275 +72,101 @@ class StripCHeader:
     #
     # PRIVATE IMPLEMENTATION
     #
-    def __init__( self, pre_parsed_header, pre_parsed_included_headers ):
+    def __directive( self, line ):
+        return tokenize_line( line ).directive()
+
+
+    # symbol_table = SymbolTable for the header (if not supplied, one is built
+    # from the pre-parsed headers)
+    def __init__( self, pre_parsed_header, pre_parsed_included_headers, symbol_table=None ):
+        if symbol_table is None:
+            symbol_table = SymbolTable( pre_parsed_header, pre_parsed_included_headers )
+        self._symbol_table = symbol_table
+        self._macro_expander = MacroExpander( symbol_table )
         self._stripped_data = list( pre_parsed_header.get_unparsed_content() )
-        self.__strip_file_data_protected_by_undefined_symbols( pre_parsed_header, pre_parsed_included_headers )
+        self.__strip_file_data_protected_by_undefined_symbols()
         self.__strip_variables()
         self.__concatenate_multi_split_lines()
         self.__strip_leftover_defined_symbols()
 
 
-    def __strip_file_data_protected_by_undefined_symbols( self, pre_parsed_header, pre_parsed_included_headers ):
-        do_stripping = self.__more_stripping_required( self._stripped_data )
-        if do_stripping:
-            self.__strip_data_protected_by_undefined_conditionals( pre_parsed_header, pre_parsed_included_headers )
-
-
-    def __strip_data_protected_by_undefined_conditionals( self, pre_parsed_header, pre_parsed_included_headers ):
-        do_more_stripping = True
+    def __strip_file_data_protected_by_undefined_symbols( self ):
+        # Single forward pass over the file, keeping a stack with the state of
+        # each open conditional block. Only the conditionals inside blocks that
+        # are being kept are evaluated.
+        lines = self._stripped_data
+        self.__index_conditional_blocks( lines )
         working_copy = []
-        while ( do_more_stripping ):
-            i = 0
-            while ( i < len( self._stripped_data ) ):
-                line = self._stripped_data[i]
-                start_of_protected_block = False
-                for start_protector in self._protected_block_starters:
-                    if ( re.search( start_protector, line ) ):
-                        start_of_protected_block = True
-                if start_of_protected_block:
-                    result = self.__process_protected_block( pre_parsed_header, pre_parsed_included_headers, self._stripped_data, i )
-                    if result['include_block']:
-                        i = result['start_block'] + 1
-                        while ( i < result['include_end'] ):
-                            working_copy.append( self._stripped_data[i] )
-                            i+=1
-                        i = result['end_block']
-                    else:
-                        i = result['end_block']
-                else:
-                    working_copy.append( line )
-                i+=1
-            self._stripped_data = list( working_copy )
-            do_more_stripping = self.__more_stripping_required( working_copy )
-            if do_more_stripping:
-                working_copy = []
-
-
-    def __more_stripping_required( self, working_copy ):
-        do_stripping = False
-        for line in working_copy:
-            for start_protector in self._protected_block_starters:
-                if ( re.search( start_protector, line ) ):
-                    do_stripping = True
-                    break
-        return do_stripping
-
-
-    def __process_protected_block( self, pre_parsed_header, pre_parsed_included_headers, lines, start_block ):
-        result = {}
-        conditional_symbols = self.__get_conditional_symbol( lines[start_block] )
-        if not conditional_symbols:
-            exit_on_error( "ERROR: Failed to parse the conditional statement:\n    %s\n"%(lines[start_block]) )
-        end_block = self.__find_end_of_protected_block( lines, start_block )
-        if self.__include_the_protected_block( start_block, end_block, lines, conditional_symbols, pre_parsed_header, pre_parsed_included_headers ):
-            result = self.__search_for_true_end_of_protected_block( start_block, end_block, lines )
-        else:
-            result = self.__search_protected_block_for_other_conditionals( start_block, end_block, lines )
-        return result
-
-
-    def __search_protected_block_for_other_conditionals( self, start_block, end_block, lines ):
-        result = {}
-        result['include_block'] = False
-        result['end_block'] = end_block
-        result['include_end'] = end_block
-        result['start_block'] = start_block
-        i = start_block + 1
-        sub_block_count = 0
-        while ( i < end_block ):
-            if re.search( '#ifdef|#ifndef|#if ', lines[i] ):
-                sub_block_count += 1
-            if ( sub_block_count > 0 ):
-                if re.search( '#endif', lines[i] ):
-                    sub_block_count -= 1
-            else:
-                if re.search( '#elif', lines[i] ):
-                    # restart parsing, starting at the #elif
-                    result['end_block'] = i-1
-                    break
-                if re.search( '#else', lines[i] ):
-                    result['include_block'] = True
-                    result['start_block'] = i
-                    break
-            i+=1
-        return result
-
-
-    def __find_end_of_protected_block( self, lines, block_start_idx ):
-        sub_block_starts = ['#ifndef','#if ', '#ifdef']
-        block_depth = 0
-        i = block_start_idx + 1
-        result = block_start_idx
-        while( i < len( lines ) ):
-            line = lines[i]
-            for sub_block_start in sub_block_starts:
-                if re.match( sub_block_start, line):
-                    block_depth += 1
-            if re.match( '#endif', line):
-                if ( block_depth == 0 ):
-                    result = i
-                else:
-                    block_depth -= 1
-            i += 1
-        return result
-
-
-    def __include_the_protected_block( self, start_block, end_block, lines, conditional_symbols, pre_parsed_header, pre_parsed_included_headers):
-        include_protected_block = False
-        for conditional in conditional_symbols:
-            symbol_is_defined = False
-            symbol_data = pre_parsed_header.lookup_defined_symbol( conditional['name'] )
-            if symbol_data:
-                symbol_is_defined = True
-            else:
-                for header in pre_parsed_included_headers:
-                    symbol_data = header.lookup_defined_symbol( conditional['name'] )
-                    if symbol_data:
-                        symbol_is_defined = True
-                        break;
-            decision = False
-            if conditional['positive_protector'] and symbol_is_defined:
-                decision = True
-            elif not conditional['positive_protector'] and not symbol_is_defined:
-                decision = True
-            elif not conditional['positive_protector'] and symbol_is_defined:
-                result = self.__search_for_true_end_of_protected_block( start_block, end_block, lines )
-                decision = self.__is_symbol_defined_inside_block( lines, start_block, result['end_block'], conditional['name'] )
-            if conditional['action'] == '':
-                include_protected_block = decision
-            elif conditional['action'] == '&&':
-                include_protected_block = decision and include_protected_block
-            elif conditional['action'] == '||':
-                include_protected_block = decision or include_protected_block
-        return include_protected_block
-
-
-    def __search_for_true_end_of_protected_block( self, block_start, block_end, lines ):
-        result = {}
-        result['include_block'] = True
-        result['start_block'] = block_start
-        result['end_block'] = block_end
-        result['include_end'] = block_end
-        i = block_start + 1
-        sub_block_starts = ['#ifndef','#if ', '#ifdef']
-        sub_block_depth = 0
-        while ( i < block_end ):
-            for sub_block_start in sub_block_starts:
-                if re.match( sub_block_start, lines[i] ):
-                    sub_block_depth += 1
-            if ( sub_block_depth > 0 ):
-                if re.match( '#endif', lines[i] ):
-                    sub_block_depth -= 1
-            elif re.search( '#else', lines[i] ) or re.search( '#elif', lines[i] ):
-                result['include_end'] = i
-                break
-            i+=1
-        return result;
-
-
-    def __is_symbol_defined_inside_block( self, lines, start_block, end_block, check_symbol ):
-        regexp = r'#define +(' + re.escape(check_symbol) + r')'
-        result = False
-        i = start_block
-        while( i < end_block ):
-            line = lines[i]
-            matched = re.match( regexp, line)
-            if ( matched ):
-                result = True
-            i += 1
-        return result
-
-
-    def __extract_defined_symbol( self, line ):
-        defined_symbol = {}
-        defined_symbol['action'] = ''
-        matched = re.match( r'((?:#ifdef|#ifndef)|(?:#if *|#elif)) *(defined|!defined)* *\(* *([A-Za-z0-9_]+)', line)
-        defined_symbol['name'] = matched.group(3).strip()
-        if matched.group(2):
-            if re.match( r'!defined', matched.group(2) ):
-                defined_symbol['positive_protector'] = False
-            elif re.match( r'defined', matched.group(2) ):
-                defined_symbol['positive_protector'] = True
-            else:
-                exit_on_error( "Failed to parse the line %s"%(line) )
-        else:
-            if re.match( r'#ifndef', matched.group(1) ):
-                defined_symbol['positive_protector'] = False
-            elif re.match( r'#ifdef', matched.group(1) ):
-                defined_symbol['positive_protector'] = True
-            elif re.match( r'#if ',matched.group(1) ):
-                new_matched = re.match( r'#if +(.+)', line )
-                if new_matched:
-                    defined_symbol['name'] = new_matched.group(1).strip()
-                    defined_symbol['positive_protector'] = True
-                    try:
-                        symbol_text = defined_symbol['name'].replace('(','').replace(')','').strip()
-                        int( symbol_text )
-                        if symbol_text == '0':
-                            # Change the symbol name from #if 0 to something creative
-                            # that's not likely to be defined anywhere so the stuff
-                            # its protecting is ignored when mocking!
-                            defined_symbol['name'] = "XYZ_DO_NOT_INCLUDE_CODE_PROTECTED_IN_THIS_BLOCK_ZYX"
-                    except ValueError:
-                        exit_on_error("Error parsing defined symbol: ", line)
-                else:
-                    exit_on_error("Error parsing defined symbol: ", line)
-
-            else:
-                exit_on_error( "Failed to parse the line %s"%(line) )
-        return defined_symbol
-
-
-    def __parse_multistatement_condition( self, condition ):
-        conditional = {}
-        matched = re.match( r'(#if|\|\|.*|&&|#elif)(.*)defined *\(* *([A-Za-z0-9_]+) *[$|\)*]' , condition )
-        if matched:
-            if ( matched.group(1).strip() == '||' ):
-                conditional['action'] = '||'
-            elif ( matched.group(1).strip() == '&&' ):
-                conditional['action'] = '&&'
-            else:
-                conditional['action'] = ''
-
-            if ( matched.group(2).strip() == '!' ):
-                conditional['positive_protector'] = False
-            else:
-                conditional['positive_protector'] = True
-            conditional['name'] = matched.group(3)
-        return conditional
-
-
-    def __split_complex_statement( self, line ):
-        temp_pos = 0
-        multi_symbols = []
-        for match in re.finditer('(&&)|(\|\|)', line ):
-            multi_symbols.append( line[temp_pos:match.start() ] )
-            temp_pos = match.start()
-        multi_symbols.append( line[temp_pos:len(line) ] )
-        return multi_symbols
-
-
-    def __get_conditional_symbol( self, line ):
-        conditional_symbols = []
-        conditional = {}
-        if re.findall('(&&)|(\|\|)', line ):
-            multi_symbols = self.__split_complex_statement( line )
-            for conditional_symbol in multi_symbols:
-                conditional = self.__parse_multistatement_condition( conditional_symbol )
-                conditional_symbols.append( conditional )
+        block_stack = []
+        keep_lines = True
+        for i in range( len( lines ) ):
+            directive = self.__directive( lines[i] )
+            if directive in self._sub_block_starters:
+                if self._block_ends[i] is None:
+                    # A block with no #endif; just drop the conditional
+                    continue
+                block = { 'parent_kept': keep_lines, 'branch_taken': False, 'end_block': self._block_ends[i] }
+                if keep_lines:
+                    block['branch_taken'] = self.__include_the_protected_block( i, block['end_block'], lines )
+                    keep_lines = block['branch_taken']
+                block_stack.append( block )
+            elif directive == 'elif' and block_stack:
+                block = block_stack[-1]
+                keep_lines = False
+                if block['parent_kept'] and not block['branch_taken']:
+                    block['branch_taken'] = self.__include_the_protected_block( i, block['end_block'], lines )
+                    keep_lines = block['branch_taken']
+            elif directive == 'else' and block_stack:
+                block = block_stack[-1]
+                keep_lines = block['parent_kept'] and not block['branch_taken']
+                block['branch_taken'] = True
+            elif directive == 'endif' and block_stack:
+                keep_lines = block_stack.pop()['parent_kept']
+            elif keep_lines:
+                working_copy.append( lines[i] )
+        self._stripped_data = working_copy
+
+
+    def __index_conditional_blocks( self, lines ):
+        # Find the matching #endif for every conditional block (None if it has
+        # no #endif) and the lines where each symbol is #defined, so neither
+        # ever has to be searched for.
+        self._block_ends = {}
+        self._defined_symbol_lines = {}
+        open_blocks = []
+        for i in range( len( lines ) ):
+            source_line = tokenize_line( lines[i] )
+            directive = source_line.directive()
+            if directive in self._sub_block_starters:
+                self._block_ends[i] = None
+                open_blocks.append( i )
+            elif directive == 'endif' and open_blocks:
+                self._block_ends[open_blocks.pop()] = i
+            elif directive == 'define' and len( source_line.tokens() ) > 2:
+                self._defined_symbol_lines.setdefault( source_line.tokens()[2].text(), [] ).append( i )
+
+
+    def __include_the_protected_block( self, start_block, end_block, lines ):
+        source_line = tokenize_line( lines[start_block] )
+        if source_line.directive() == 'ifdef':
+            expression = 'defined ' + source_line.directive_argument()
+        elif source_line.directive() == 'ifndef':
+            expression = '!defined ' + source_line.directive_argument()
         else:
-            conditional_symbol = self.__extract_defined_symbol( line )
-            conditional_symbols.append( conditional_symbol )
-        if not conditional_symbols:
-            raise Exception( "\nFailed to parse the conditional statement:\n    %s\n"%(lines[start_block]) )
-        return conditional_symbols
+            expression = source_line.directive_argument()
+        context = ConditionalBlockContext( self._symbol_table, self._macro_expander, self._defined_symbol_lines, start_block, end_block )
+        try:
+            return bool( compile_conditional_expression( expression ).evaluate( context ) )
+        except ValueError as e:
+            exit_on_error( "ERROR: Failed to parse the conditional statement:\n    %s\n    %s\n"%( lines[start_block], e ) )
 
 
     def __strip_variables( self ):
         working_copy = []
         for line in self._stripped_data:
-            matched = re.match( r'struct +([A-Za-z0-9]+)(;)', line)
-            if not matched:
+            # Strip forward declarations, i.e. "struct foo;"
+            tokens = tokenize_line( line ).tokens()
+            if not ( len( tokens ) >= 3 and tokens[0].text() == 'struct' and tokens[1].type() == TokenType.TOKEN_IDENTIFIER and tokens[2].text() == ';' ):
                 working_copy.append(line);
         self._stripped_data = list( working_copy )
 
@@ -302,9 +175,9 @@ class StripCHeader:
         working_copy = []
         concatenated_line = ''
         for line in self._stripped_data:
-            matched = re.match( r'(.*)\\', line.strip() )
-            if ( matched ):
-                concatenated_line += matched.group(1)
+            tokens = tokenize_line( line ).tokens()
+            if tokens and tokens[-1].text() == '\\':
+                concatenated_line += line[0:tokens[-1].start()].lstrip()
             else:
                 if ( concatenated_line != '' ):
                     concatenated_line += line.strip()
@@ -318,7 +191,7 @@ class StripCHeader:
     def __strip_leftover_defined_symbols( self ):
         working_copy = []
         for line in self._stripped_data:
-            if not line.strip().startswith( '#define' ):
+            if self.__directive( line ) != 'define':
                 working_copy.append( line )
         self._stripped_data = list( working_copy )
 
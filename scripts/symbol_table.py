@@ -0,0 +1,47 @@
+#!/usr/bin/python
+# @file symbol_table.py
+# @author matthew.denis.conway@gmail.com
+# @description Table of the symbols #defined by the header to mock and the
+# headers it includes, indexed by symbol name
+
+
+from mcmock_utils import *
+
+
+class SymbolTable:
+
+
+    # API to look up a defined symbol by name; if the symbol is defined more
+    # than once, the definition with the highest precedence is returned (or
+    # None if the symbol isn't defined)
+    def lookup_defined_symbol( self, lookup ):
+        definitions = self.symbols.get( lookup )
+        if definitions:
+            return definitions[0]
+        return None
+
+
+    # API to check if a symbol has been defined
+    def is_defined( self, lookup ):
+        return lookup in self.symbols
+
+
+    # API to get every definition of a symbol, in order of precedence
+    def get_definitions( self, lookup ):
+        return self.symbols.get( lookup, [] )
+
+
+    # API to get the filenames of the headers the symbols were taken from, in
+    # order of precedence (the header to mock comes first, followed by the
+    # included headers in the order they were included)
+    def get_precedence( self ):
+        return self.precedence
+
+
+    def __init__( self, pre_parsed_header, pre_parsed_included_headers ):
+        self.symbols = {}
+        self.precedence = []
+        for header in [ pre_parsed_header ] + list( pre_parsed_included_headers ):
+            self.precedence.append( header.get_filename() )
+            for symbol in header.get_defined_symbols():
+                self.symbols.setdefault( symbol.name(), [] ).append( symbol )
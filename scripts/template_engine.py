@@ -0,0 +1,88 @@
+#!/usr/bin/python
+# @file template_engine.py
+# @author matthew.denis.conway@gmail.com
+# @description Render the templates used to generate mocks; each template is
+# split into literal text and <placeholder> segments once, so rendering is a
+# single pass which appends the segments to a list of chunks
+
+
+import re
+
+
+placeholder_regex = re.compile( r'<([a-z_]+)>' )
+
+
+# Each template is only ever compiled once
+compiled_templates = {}
+
+
+# Function to get the compiled version of a template
+def compile_template( template ):
+    compiled = compiled_templates.get( template )
+    if compiled is None:
+        compiled = CompiledTemplate( template )
+        compiled_templates[template] = compiled
+    return compiled
+
+
+class CompiledTemplate:
+
+
+    # API to render the template, appending the rendered chunks to a list (so
+    # the output is only joined once, when all of it has been rendered).
+    # values = dictionary of placeholder name to either a string, or a list of
+    # already rendered chunks. Placeholders without a value are left in the
+    # output as they are.
+    def render_into( self, chunks, values ):
+        for literal, placeholder in self.segments:
+            if literal:
+                chunks.append( literal )
+            if placeholder is not None:
+                if placeholder in values:
+                    value = values[placeholder]
+                    if isinstance( value, list ):
+                        chunks.extend( value )
+                    else:
+                        chunks.append( value )
+                else:
+                    chunks.append( '<%s>'%( placeholder ) )
+        return chunks
+
+
+    # API to render the template as a generator of chunks. values = dictionary
+    # of placeholder name to either a string, or an iterable (i.e. a list or a
+    # generator) of chunks, which is only consumed as the output is.
+    def render_chunks( self, values ):
+        for literal, placeholder in self.segments:
+            if literal:
+                yield literal
+            if placeholder is not None:
+                if placeholder in values:
+                    value = values[placeholder]
+                    if isinstance( value, str ):
+                        yield value
+                    else:
+                        for chunk in value:
+                            yield chunk
+                else:
+                    yield '<%s>'%( placeholder )
+
+
+    # API to render the template to a string
+    def render( self, values ):
+        return ''.join( self.render_into( [], values ) )
+
+
+    #
+    # PRIVATE IMPLEMENTATION
+    #
+    # The template is held as a list of ( literal, placeholder ) segments, where
+    # the placeholder follows the literal text (and is None for the last
+    # segment)
+    def __init__( self, template ):
+        self.segments = []
+        position = 0
+        for matched in placeholder_regex.finditer( template ):
+            self.segments.append( ( template[position:matched.start()], matched.group( 1 ) ) )
+            position = matched.end()
+        self.segments.append( ( template[position:], None ) )